@@ -1,14 +1,22 @@
 import os
+import io
+import csv
+import json
 import time
+import zlib
+import click
 import requests
 from requests import RequestException
 from dotenv import load_dotenv
-from flask import Flask, render_template, redirect, url_for, flash, request, session
+from flask import (
+    Flask, render_template, redirect, url_for, flash, request, session,
+    Response, stream_with_context, abort, jsonify, make_response, send_from_directory, g
+)
 from flask_migrate import Migrate
 from flask_login import (
     login_user, logout_user, login_required, LoginManager, current_user
 )
-from flask_babel import Babel, _
+from flask_babel import Babel, _, force_locale
 from werkzeug.utils import secure_filename
 from werkzeug.datastructures import FileStorage
 from werkzeug.exceptions import RequestEntityTooLarge
@@ -21,6 +29,13 @@ from forms import (
     # ResetPasswordForm  # ← увімкни, якщо реально є у forms.py
 )
 from models import db, User, Game, UserGame
+from playtime import rollup_playtime, playtime_series
+from page_cache import PageCache
+from recommendations import build_similarities, recommend_for_user
+from dedup import find_existing_game, find_duplicate_clusters, merge_games
+from query_log import init_query_log, aggregate as aggregate_query_log
+from profiler import init_profiler, list_profiles, format_top
+import jobs
 
 # -------------------- Конфіг/ініціалізація --------------------
 
@@ -30,7 +45,7 @@ API_KEY = os.getenv("RAWG_API_KEY")
 BASE_URL = 'https://api.rawg.io/api/games'
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///gamelibrary.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL", 'sqlite:///gamelibrary.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.config['SECRET_KEY'] = os.getenv("SECRET_KEY")
@@ -45,12 +60,52 @@ app.config['AVATAR_UPLOAD_FOLDER'] = 'static/avatars'
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['MAX_CONTENT_LENGTH'] = 2 * 1024 * 1024  # 2MB
 
+# Експорт бібліотеки: скільки рядків тягнемо з курсора за раз
+app.config['EXPORT_BATCH_SIZE'] = 1000
+
+# Журнал повільних запитів (0 — вимкнено)
+app.config['SLOW_QUERY_THRESHOLD_MS'] = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", 200))
+app.config['SLOW_QUERY_LOG'] = os.path.join(app.instance_path, 'slow_queries.ndjson')
+
+# Публічні сторінки: браузер / reverse proxy (s-maxage), секунди
+app.config['PUBLIC_PAGE_MAX_AGE'] = 60
+app.config['PUBLIC_PAGE_S_MAXAGE'] = 600
+
+# Адміністратори (через кому) — їм доступне профілювання запитів
+app.config['ADMIN_USERNAMES'] = {u.strip() for u in os.getenv("ADMIN_USERNAMES", "").split(",") if u.strip()}
+
+# Профілювання окремих запитів (?_profile=cprofile,sample,alloc або заголовок X-Profile);
+# вимкнено — хуки не реєструються взагалі
+app.config['PROFILING_ENABLED'] = os.getenv("PROFILING_ENABLED", "0") == "1"
+app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv("PROFILE_SAMPLE_RATE", 1.0))
+app.config['PROFILE_DIR'] = os.path.join(app.instance_path, 'profiles')
+
+# Фонові задачі (flask jobs worker): оренда задачі, опитування черги — секунди
+app.config['JOB_VISIBILITY_TIMEOUT'] = 300
+app.config['JOB_POLL_INTERVAL'] = 1.0
+app.config['JOB_RETENTION_DAYS'] = 7
+# Періодичні задачі: kind -> інтервал у секундах
+app.config['JOB_SCHEDULES'] = {
+    'playtime.rollup': 15 * 60,
+    'recommendations.build': 6 * 3600,
+    # інкрементальний build не бачить видалених/злитих посилань — раз на добу перераховуємо все
+    'recommendations.rebuild': 24 * 3600,
+    'rawg.popular': 3600,
+    'jobs.purge': 24 * 3600,
+}
+# Кеш популярних ігор з RAWG (оновлює задача rawg.popular)
+app.config['POPULAR_GAMES_CACHE'] = os.path.join(app.instance_path, 'popular_games.json')
+
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['AVATAR_UPLOAD_FOLDER'], exist_ok=True)
+os.makedirs(app.instance_path, exist_ok=True)
 
 db.init_app(app)
 migrate = Migrate(app, db)
 
+with app.app_context():
+    init_query_log(app, db.engine)
+
 # Логін
 login_manager = LoginManager(app)
 login_manager.login_view = "login"
@@ -58,6 +113,14 @@ login_manager.login_view = "login"
 # CSRF
 csrf = CSRFProtect(app)
 
+def is_admin():
+    return current_user.is_authenticated and current_user.username in app.config['ADMIN_USERNAMES']
+
+init_profiler(app, is_admin)
+
+# Кеш публічних сторінок бібліотек
+page_cache = PageCache()
+
 # Щоб у всіх шаблонах працювало {{ csrf_token() }}
 @app.context_processor
 def csrf_token_processor():
@@ -81,19 +144,150 @@ app.jinja_env.globals.update(_=_)
 def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+def save_cover(file_storage):
+    filename = secure_filename(file_storage.filename)
+    file_storage.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+    return filename
+
 @login_manager.user_loader
 def load_user(user_id):
     return db.session.get(User, int(user_id))
 
 def fetch_popular_games(limit=10):
+    # Спершу — кеш, який оновлює фонова задача; у мережу йдемо лише якщо кешу ще немає
     try:
-        params = {'key': API_KEY, 'ordering': '-rating', 'page_size': limit}
-        r = requests.get(BASE_URL, params=params, timeout=10)
-        if r.status_code == 200:
-            return r.json().get('results', [])
-    except RequestException:
+        with open(app.config['POPULAR_GAMES_CACHE'], encoding='utf-8') as f:
+            return json.load(f)[:limit]
+    except (OSError, ValueError):
         pass
-    return []
+    try:
+        return refresh_popular_games(limit=limit)
+    except (RequestException, ValueError):
+        return []
+
+# -------------------- Фонові задачі --------------------
+
+@jobs.handler('rawg.popular')
+def refresh_popular_games(limit=10):
+    params = {'key': API_KEY, 'ordering': '-rating', 'page_size': limit}
+    r = requests.get(BASE_URL, params=params, timeout=10)
+    r.raise_for_status()
+    games = r.json().get('results', [])
+    path = app.config['POPULAR_GAMES_CACHE']
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(games, f, ensure_ascii=False)
+    os.replace(path + '.tmp', path)
+    return games
+
+@jobs.handler('covers.download')
+def download_cover(game_id, url):
+    game = db.session.get(Game, game_id)
+    # гру видалили або обкладинку вже змінили вручну — качати нічого
+    if game is None or game.cover != url:
+        return
+    r = requests.get(url, timeout=10)
+    r.raise_for_status()
+    ext = url.rsplit('.', 1)[-1].split('?')[0]
+    cover_filename = f"{game_id}_{int(time.time())}.{ext}"
+    with open(os.path.join(app.config['UPLOAD_FOLDER'], cover_filename), 'wb') as f:
+        f.write(r.content)
+    game.cover = cover_filename
+
+@jobs.handler('rawg.details')
+def fetch_game_details(game_id):
+    game = db.session.get(Game, game_id)
+    if game is None:
+        return
+    r = requests.get(f"{BASE_URL}/{game_id}", params={'key': API_KEY}, timeout=10)
+    r.raise_for_status()
+    game.apply_rawg(r.json())
+
+@jobs.handler('playtime.rollup')
+def rollup_playtime_job():
+    rollup_playtime()
+
+@jobs.handler('recommendations.build')
+def build_recommendations_job(full=False):
+    build_similarities(full=full)
+
+@jobs.handler('recommendations.rebuild')
+def rebuild_recommendations_job():
+    build_similarities(full=True)
+
+@jobs.handler('jobs.purge')
+def purge_jobs_job():
+    jobs.purge(app.config['JOB_RETENTION_DAYS'])
+
+# -------------------- Експорт бібліотеки --------------------
+
+EXPORT_COLUMNS = (
+    'title', 'platform', 'release_year',
+    'hours_played', 'rating', 'imported_from', 'updated_at',
+)
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+def iter_library_rows(user_id):
+    # Лише колонки (без ORM-об'єктів) + yield_per → серверний курсор,
+    # тож у пам'яті одночасно тримається не більше однієї пачки рядків
+    batch_size = app.config['EXPORT_BATCH_SIZE']
+    stmt = (
+        db.select(
+            Game.title, Game.platform, Game.release_year,
+            UserGame.hours_played, UserGame.rating,
+            UserGame.imported_from, UserGame.updated_at,
+        )
+        .join(UserGame.game)
+        .where(UserGame.user_id == user_id)
+        .order_by(UserGame.id)
+        .execution_options(yield_per=batch_size)
+    )
+    yield from db.session.execute(stmt)
+
+def _csv_chunks(rows, batch_size):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % batch_size == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+def _ndjson_chunks(rows, batch_size):
+    lines = []
+    for row in rows:
+        item = dict(zip(EXPORT_COLUMNS, row))
+        if item['updated_at'] is not None:
+            item['updated_at'] = item['updated_at'].isoformat()
+        lines.append(json.dumps(item, ensure_ascii=False))
+        if len(lines) >= batch_size:
+            yield "\n".join(lines) + "\n"
+            lines.clear()
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+EXPORT_ENCODERS = {
+    'csv': _csv_chunks,
+    'ndjson': _ndjson_chunks,
+}
+
+def _encode_chunks(chunks, compress=False):
+    # wbits=31 → повноцінний gzip-контейнер, стиснення інкрементальне
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        if gz:
+            data = gz.compress(data)
+        if data:
+            yield data
+    if gz:
+        yield gz.flush()
+
 # -------------------- Роути --------------------
 
 @app.route("/")
@@ -101,17 +295,28 @@ def fetch_popular_games(limit=10):
 def home():
     user_games = UserGame.query.filter_by(user_id=current_user.id).all()
     popular_games = []
-    # якщо бібліотека порожня — тягнемо популярні ігри
+    recommended_games = []
+    # якщо бібліотека порожня — тягнемо популярні ігри, інакше — персональні рекомендації
     if not user_games:
         popular_games = fetch_popular_games(limit=10)
-    return render_template("index.html", user_games=user_games, popular_games=popular_games)
+    else:
+        recommended_games = recommend_for_user(current_user.id, limit=8)
+    return render_template(
+        "index.html", user_games=user_games,
+        popular_games=popular_games, recommended_games=recommended_games,
+    )
 
 @app.route("/games")
 @login_required
 def game_list():
     view = request.args.get('view', 'list')
     query = request.args.get('query', '').strip()
-    user_games = UserGame.query.filter_by(user_id=current_user.id).all()
+    # Game підтягуємо одним JOIN (extra_data відкладено, тож рядки легкі)
+    user_games = (
+        UserGame.query.filter_by(user_id=current_user.id)
+        .options(db.joinedload(UserGame.game))
+        .all()
+    )
 
     games = []
     try:
@@ -146,26 +351,18 @@ def add_game_to_library(game_id):
         release_year = request.form.get('release_year')
         cover_url = request.form.get('cover_url')
 
-        cover_filename = None
-        if cover_url:
-            try:
-                r = requests.get(cover_url, timeout=10)
-                if r.status_code == 200:
-                    ext = cover_url.rsplit('.', 1)[-1].split('?')[0]
-                    cover_filename = f"{game_id}_{int(time.time())}.{ext}"
-                    with open(os.path.join(app.config['UPLOAD_FOLDER'], cover_filename), 'wb') as f:
-                        f.write(r.content)
-            except requests.RequestException:
-                cover_filename = None
-
+        # Поки воркер не скачав обкладинку, показуємо її за віддаленим URL
         game = Game(
             id=game_id,
             title=title,
             platform=platform,
             release_year=release_year,
-            cover=cover_filename
+            cover=cover_url or None
         )
         db.session.add(game)
+        if cover_url:
+            jobs.enqueue('covers.download', {'game_id': game_id, 'url': cover_url}, priority=10)
+        jobs.enqueue('rawg.details', {'game_id': game_id})
         db.session.commit()
 
     existing_link = UserGame.query.filter_by(user_id=current_user.id, game_id=game.id).first()
@@ -197,23 +394,69 @@ def edit_game(game_id):
     form = AddGameForm(obj=user_game.game)
 
     if form.validate_on_submit():
-        user_game.game.title = form.title.data
-        user_game.game.platform = form.platform.data
-        user_game.game.release_year = form.release_year.data
-        user_game.hours_played = form.hours_played.data or 0
-        user_game.rating = form.rating.data
-
+        game = user_game.game
+        cover_filename = None
         if form.cover.data and isinstance(form.cover.data, FileStorage):
             if allowed_file(form.cover.data.filename):
-                filename = secure_filename(form.cover.data.filename)
-                form.cover.data.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                user_game.game.cover = filename
+                cover_filename = save_cover(form.cover.data)
+
+        changed = (form.title.data, form.platform.data, form.release_year.data) != \
+            (game.title, game.platform, game.release_year)
+        shared = UserGame.query.filter(
+            UserGame.game_id == game.id, UserGame.user_id != current_user.id
+        ).first() is not None
+        copied = bool(changed or cover_filename) and shared
+        if copied:
+            # Запис каталогу є й у інших бібліотеках — правимо власну копію, а не їхню гру.
+            # Копія має локальний id, тож rawg.details її не дозаповнить — переносимо дані RAWG одразу
+            game = Game(
+                title=game.title,
+                platform=game.platform,
+                release_year=game.release_year,
+                cover=game.cover,
+                genres=list(game.genres),
+                extra_data=game.extra_data,
+                slug=game.slug,
+                released=game.released,
+                metacritic=game.metacritic,
+                rawg_rating=game.rawg_rating,
+                background_image=game.background_image,
+            )
+            db.session.add(game)
+            user_game.game = game
+
+        game.title = form.title.data
+        game.platform = form.platform.data
+        game.release_year = form.release_year.data
+        if cover_filename:
+            game.cover = cover_filename
+        user_game.set_hours_played(form.hours_played.data)
+        user_game.rating = form.rating.data
 
+        if copied and game.cover and game.cover.startswith(('http://', 'https://')):
+            # Обкладинка ще за віддаленим URL — скачуємо її вже для копії
+            db.session.flush()
+            jobs.enqueue('covers.download', {'game_id': game.id, 'url': game.cover}, priority=10)
         db.session.commit()
         flash(_("Game data updated"), "success")
         return redirect(url_for("game_list"))
 
-    return render_template("games/edit.html", form=form, user_game=user_game)
+    history = playtime_series(current_user.id, user_game_id=user_game.id)
+    return render_template("games/edit.html", form=form, user_game=user_game, history=history)
+
+# Історія наігрованого часу (точки для графіків)
+@app.route("/games/<int:game_id>/playtime.json")
+@login_required
+def game_playtime(game_id):
+    user_game = UserGame.query.filter_by(user_id=current_user.id, game_id=game_id).first()
+    if not user_game:
+        abort(404)
+    return jsonify(playtime_series(current_user.id, user_game_id=user_game.id))
+
+@app.route("/playtime.json")
+@login_required
+def library_playtime():
+    return jsonify(playtime_series(current_user.id))
 
 # Ручне додавання гри
 @app.route("/games/add", methods=["GET", "POST"])
@@ -232,34 +475,43 @@ def add_game():
     ]
 
     if form.validate_on_submit():
-        cover_filename = None
-        if form.cover.data and allowed_file(form.cover.data.filename):
-            filename = secure_filename(form.cover.data.filename)
-            form.cover.data.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            cover_filename = filename
+        # збережемо активний вигляд (list/tiles), якщо є
+        view = request.args.get("view", "list")
 
-        game = Game(
-            title=form.title.data,
-            release_year=form.release_year.data,
-            platform=form.platform.data,
-            cover=cover_filename,
-        )
-        db.session.add(game)
-        db.session.commit()
+        # Файл обкладинки пишемо, лише коли він справді знадобиться (нова гра або гра без обкладинки)
+        upload = form.cover.data if form.cover.data and allowed_file(form.cover.data.filename) else None
+
+        # Не плодимо дублікати в каталозі: шукаємо схожу назву на тій же платформі/роках
+        game = find_existing_game(form.title.data, form.platform.data, form.release_year.data)
+        if game is None:
+            game = Game(
+                title=form.title.data,
+                release_year=form.release_year.data,
+                platform=form.platform.data,
+                cover=save_cover(upload) if upload else None,
+            )
+            db.session.add(game)
+            db.session.commit()
+        else:
+            if UserGame.query.filter_by(user_id=current_user.id, game_id=game.id).first():
+                flash(_("This game is already in your library."), "warning")
+                return redirect(url_for("game_list", view=view))
+            if upload and not game.cover:
+                game.cover = save_cover(upload)
+            flash(_("Linked to the existing catalog entry \"%(title)s\".", title=game.title), "info")
 
         user_game = UserGame(
             user_id=current_user.id,
             game_id=game.id,
-            hours_played=form.hours_played.data or 0,
+            hours_played=0,
             rating=form.rating.data,
             imported_from="manual",
         )
+        user_game.set_hours_played(form.hours_played.data)
         db.session.add(user_game)
         db.session.commit()
 
         flash(_("Game added to your library!"), "success")
-        # збережемо активний вигляд (list/tiles), якщо є
-        view = request.args.get("view", "list")
         return redirect(url_for("game_list", view=view))
 
     # 🟢 якщо GET або форма невалідна — показуємо форму з помилками
@@ -278,6 +530,30 @@ def delete_user_game(game_id):
     # Повертаємось туди, звідки прийшли (або на список)
     return redirect(request.referrer or url_for("game_list"))
 
+# Експорт бібліотеки (CSV / NDJSON, опційно gzip) — віддаємо потоком
+@app.route("/games/export.<fmt>")
+@login_required
+def export_library(fmt):
+    if fmt not in EXPORT_ENCODERS:
+        abort(404)
+    compress = request.args.get('gzip') == '1'
+    batch_size = app.config['EXPORT_BATCH_SIZE']
+
+    rows = iter_library_rows(current_user.id)
+    chunks = _encode_chunks(EXPORT_ENCODERS[fmt](rows, batch_size), compress=compress)
+
+    filename = secure_filename(f"{current_user.username}_library.{fmt}") or f"library.{fmt}"
+    mimetype = EXPORT_MIMETYPES[fmt]
+    if compress:
+        filename += ".gz"
+        mimetype = 'application/gzip'
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+    )
+
 @app.route("/import")
 @login_required
 def import_games():
@@ -364,6 +640,7 @@ def settings():
 
         current_user.username = form.username.data
         current_user.email = form.email.data
+        current_user.is_public = form.is_public.data
 
         if form.avatar.data and isinstance(form.avatar.data, FileStorage):
             ext = form.avatar.data.filename.rsplit('.', 1)[-1].lower()
@@ -408,6 +685,62 @@ def delete_account():
         return redirect(url_for("home"))
     return render_template("users/delete_account.html", form=form)
 
+# Публічна (read-only) сторінка бібліотеки — лише якщо користувач сам увімкнув
+@app.route("/u/<username>")
+def public_library(username):
+    # Мову беремо лише з ?lang (без сесії), щоб сторінку можна було кешувати
+    locale = request.args.get('lang')
+    if locale not in app.config['BABEL_SUPPORTED_LOCALES']:
+        locale = app.config['BABEL_DEFAULT_LOCALE']
+
+    owner = db.session.execute(
+        db.select(User.id, User.library_version)
+        .where(User.username == username, User.is_public.is_(True))
+    ).first()
+    if not owner:
+        abort(404)
+
+    # Сторінка однакова для всіх відвідувачів: не даємо Flask-Login завантажувати
+    # current_user (з remember_token він записав би сесію у відповідь)
+    g._login_user = login_manager.anonymous_user()
+
+    etag = f"u{owner.id}-v{owner.library_version}-{locale}"
+    if etag in request.if_none_match:
+        response = make_response("", 304)
+    else:
+        html = page_cache.get(owner.id, owner.library_version, locale)
+        if html is None:
+            user = db.session.get(User, owner.id)
+            user_games = (
+                UserGame.query.filter_by(user_id=owner.id)
+                .options(db.joinedload(UserGame.game))
+                .order_by(UserGame.id)
+                .all()
+            )
+            with force_locale(locale):
+                html = render_template(
+                    "users/public_library.html",
+                    owner=user, user_games=user_games, public_page=True,
+                )
+            page_cache.set(owner.id, owner.library_version, locale, html)
+        response = make_response(html)
+
+    response.set_etag(etag)
+    response.headers['Surrogate-Key'] = f"user-{owner.id}"
+    response.headers['Content-Language'] = locale
+    if session.modified:
+        # Хтось усе ж записав сесію (Set-Cookie) — таку відповідь не можна віддавати спільному кешу
+        response.cache_control.private = True
+        response.cache_control.no_store = True
+        return response
+
+    response.cache_control.public = True
+    response.cache_control.max_age = app.config['PUBLIC_PAGE_MAX_AGE']
+    response.cache_control.s_maxage = app.config['PUBLIC_PAGE_S_MAXAGE']
+    # Сесію лише читали, вміст від неї не залежить — не даємо Flask додати `Vary: Cookie`
+    session.accessed = False
+    return response
+
 @app.route("/terms_of_service")
 def terms_of_service():
     return render_template("terms_of_service.html")
@@ -439,12 +772,170 @@ def search_games():
     user_games = UserGame.query.filter_by(user_id=current_user.id).all()
     return render_template('index.html', user_games=user_games, games=games)
 
+# Профілі запитів (лише для адміністраторів)
+@app.route("/admin/profiles")
+@login_required
+def admin_profiles():
+    if not is_admin():
+        abort(404)
+    profiles = list_profiles(app.config['PROFILE_DIR'])
+    return render_template("admin/profiles.html", profiles=profiles,
+                           enabled=app.config['PROFILING_ENABLED'])
+
+@app.route("/admin/profiles/<path:filename>")
+@login_required
+def download_profile(filename):
+    if not is_admin():
+        abort(404)
+    return send_from_directory(app.config['PROFILE_DIR'], filename, as_attachment=True)
+
 # Обробка завеликого файлу
 @app.errorhandler(RequestEntityTooLarge)
 def handle_file_too_large(e):
     flash(_("File is too large. Max size is 2MB."), "warning")
     return redirect(request.url)
 
+# -------------------- CLI --------------------
+
+@app.cli.group()
+def playtime():
+    """Playtime history."""
+
+@playtime.command("rollup")
+def playtime_rollup_command():
+    """Roll new playtime events up into daily/weekly/monthly buckets."""
+    changed = rollup_playtime()
+    click.echo(f"Rolled up playtime for {changed} library entries.")
+
+@app.cli.group()
+def recommendations():
+    """"You might also like" recommendations."""
+
+@recommendations.command("build")
+@click.option("--full", is_flag=True, help="Recompute neighbours for every game, not only changed users' games.")
+@click.option("--top-k", default=20, show_default=True, help="Neighbours stored per game.")
+def recommendations_build_command(full, top_k):
+    """Precompute top-K similar games into the game_similarity table."""
+    refreshed = build_similarities(full=full, top_k=top_k)
+    click.echo(f"Refreshed neighbours for {refreshed} games.")
+
+@app.cli.group()
+def catalog():
+    """Game catalog maintenance."""
+
+@catalog.command("dedupe")
+@click.option("--threshold", default=0.85, show_default=True, help="Minimum title similarity (0..1).")
+@click.option("--merge", is_flag=True, help="Merge every cluster into its most-owned game (listed first).")
+def catalog_dedupe_command(threshold, merge):
+    """Find near-duplicate games and optionally merge them."""
+    clusters = find_duplicate_clusters(threshold=threshold)
+    titles = dict(db.session.execute(
+        db.select(Game.id, Game.title).where(Game.id.in_([i for c in clusters for i in c]))
+    ).all()) if clusters else {}
+
+    moved = 0
+    for cluster in clusters:
+        keep_id = cluster[0]
+        click.echo(f"{titles[keep_id]!r} ← " + ", ".join(
+            f"{titles[i]!r} (#{i})" for i in cluster if i != keep_id
+        ))
+        if merge:
+            moved += merge_games(keep_id, cluster)
+    if merge:
+        db.session.commit()
+        click.echo(f"Merged {len(clusters)} clusters, re-pointed {moved} library links.")
+    else:
+        click.echo(f"Found {len(clusters)} clusters (dry run, use --merge to apply).")
+
+@app.cli.group()
+def queries():
+    """Slow-query log."""
+
+@queries.command("report")
+@click.option("--log", "log_path", type=click.Path(dir_okay=False), help="NDJSON log (defaults to SLOW_QUERY_LOG).")
+@click.option("--top", default=20, show_default=True, help="How many statements to show.")
+def queries_report_command(log_path, top):
+    """Aggregate slow queries and flag full-table scans."""
+    log_path = log_path or app.config['SLOW_QUERY_LOG']
+    if not os.path.exists(log_path):
+        click.echo(f"No slow-query log at {log_path}.")
+        return
+    with open(log_path, encoding='utf-8') as f:
+        report = aggregate_query_log(f)
+
+    for item in report[:top]:
+        click.echo(
+            f"{item['total_ms']:>10.1f} ms total  {item['count']:>5}x  "
+            f"avg {item['avg_ms']:.1f} ms  max {item['max_ms']:.1f} ms  "
+            f"[{', '.join(item['routes']) or '-'}]"
+        )
+        click.echo("    " + " ".join(item['statement'].split()))
+        for detail in item['plan'] or ():
+            click.echo(f"    plan: {detail}")
+        for table in item['full_scans']:
+            click.secho(f"    FULL SCAN on {table}", fg="yellow")
+        for suggestion in item['suggestions']:
+            click.secho(f"    suggest: {suggestion};", fg="green")
+        click.echo()
+
+@app.cli.group()
+def profiles():
+    """Per-request profiles."""
+
+@profiles.command("report")
+@click.argument("profile_id", required=False)
+@click.option("--last", default=10, show_default=True, help="How many recent profiles to list.")
+def profiles_report_command(profile_id, last):
+    """Show top cumulative functions by package for a profile (or list recent ones)."""
+    found = list_profiles(app.config['PROFILE_DIR'], limit=None if profile_id else last)
+    if profile_id:
+        found = [p for p in found if p['id'] == profile_id]
+        if not found:
+            click.echo(f"No profile {profile_id} in {app.config['PROFILE_DIR']}.")
+            return
+    elif not found:
+        click.echo(f"No profiles in {app.config['PROFILE_DIR']}.")
+        return
+
+    for summary in found:
+        click.echo(f"{summary['id']}  {summary['path']}  {summary['status']}  {summary['duration_ms']:.1f} ms")
+        if 'alloc_peak_kib' in summary:
+            click.echo(f"    allocations peak {summary['alloc_peak_kib']:.1f} KiB")
+        click.echo("    files: " + ", ".join(summary['files']))
+        if profile_id:
+            click.echo(format_top(summary))
+
+@app.cli.group("jobs")
+def jobs_cli():
+    """Background job queue."""
+
+@jobs_cli.command("worker")
+@click.option("--concurrency", "-c", default=2, show_default=True, help="Worker threads or processes.")
+@click.option("--mode", type=click.Choice(["thread", "process"]), default="thread", show_default=True)
+@click.option("--no-schedule", is_flag=True, help="Don't enqueue periodic jobs from this worker.")
+def jobs_worker_command(concurrency, mode, no_schedule):
+    """Run queued jobs until interrupted (Ctrl+C / SIGTERM)."""
+    schedules = None if no_schedule else app.config['JOB_SCHEDULES']
+    click.echo(f"Starting {concurrency} {mode} worker(s), handlers: {', '.join(sorted(jobs.HANDLERS))}")
+    jobs.run_worker(app, concurrency=concurrency, mode=mode, schedules=schedules)
+
+@jobs_cli.command("status")
+def jobs_status_command():
+    """Show job counts by kind and status."""
+    for kind, status, count in jobs.stats():
+        click.echo(f"{kind:<24} {status:<8} {count:>7}")
+
+@jobs_cli.command("enqueue")
+@click.argument("kind")
+@click.option("--priority", default=0, show_default=True)
+def jobs_enqueue_command(kind, priority):
+    """Enqueue a job without payload (e.g. recommendations.build)."""
+    if kind not in jobs.HANDLERS:
+        raise click.BadParameter(f"unknown kind, expected one of: {', '.join(sorted(jobs.HANDLERS))}")
+    jobs.enqueue(kind, priority=priority)
+    db.session.commit()
+    click.echo(f"Enqueued {kind}.")
+
 # -------------------- entrypoint --------------------
 if __name__ == "__main__":
     app.run(debug=True, port=5001)
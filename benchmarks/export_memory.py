@@ -0,0 +1,101 @@
+"""Бенчмарк пам'яті для потокового експорту бібліотеки.
+
+Створює тимчасову SQLite-базу з одним користувачем і N ігор у бібліотеці,
+стрімить /games/export.<fmt> і знімає RSS процесу по ходу читання відповіді.
+Для порівняння міряє і "наївний" варіант через UserGame.query...all().
+
+    python benchmarks/export_memory.py --rows 100000 --fmt csv --gzip
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def rss_mb():
+    # Поточний RSS (Linux); інакше — пік із getrusage
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed(db, User, Game, UserGame, rows):
+    user = User(username="bench", email="bench@example.com")
+    user.set_password("bench")
+    db.session.add(user)
+    db.session.commit()
+
+    step = 10_000
+    for start in range(0, rows, step):
+        stop = min(start + step, rows)
+        db.session.execute(db.insert(Game), [
+            {"id": i + 1, "title": f"Game #{i}", "platform": "PC", "release_year": 2000 + i % 25}
+            for i in range(start, stop)
+        ])
+        db.session.execute(db.insert(UserGame), [
+            {"user_id": user.id, "game_id": i + 1, "hours_played": i % 500,
+             "rating": i % 10 + 1, "imported_from": "manual"}
+            for i in range(start, stop)
+        ])
+        db.session.commit()
+    return user.id
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--fmt", choices=("csv", "ndjson"), default="csv")
+    parser.add_argument("--gzip", action="store_true")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp, "bench.db")
+    os.environ.setdefault("SECRET_KEY", "bench")
+
+    from flask_login import FlaskLoginClient
+    from app import app
+    from models import db, User, Game, UserGame
+
+    app.test_client_class = FlaskLoginClient
+    with app.app_context():
+        db.create_all()
+        user_id = seed(db, User, Game, UserGame, args.rows)
+        user = db.session.get(User, user_id)
+        db.session.expunge_all()
+
+    baseline = rss_mb()
+    print(f"rows={args.rows} fmt={args.fmt} gzip={args.gzip}")
+    print(f"baseline RSS: {baseline:.1f} MB")
+
+    url = f"/games/export.{args.fmt}" + ("?gzip=1" if args.gzip else "")
+    started = time.perf_counter()
+    total = 0
+    peak = baseline
+    with app.test_client(user=user) as client:
+        resp = client.get(url, buffered=False)
+        for i, chunk in enumerate(resp.response):
+            total += len(chunk)
+            if i % 10 == 0:
+                peak = max(peak, rss_mb())
+        resp.close()
+    elapsed = time.perf_counter() - started
+    print(f"streamed {total / 2**20:.1f} MB in {elapsed:.2f}s, peak RSS: {peak:.1f} MB "
+          f"(+{peak - baseline:.1f} MB)")
+
+    with app.app_context():
+        before = rss_mb()
+        links = UserGame.query.filter_by(user_id=user_id).all()
+        _ = [link.game.title for link in links]
+        print(f"naive .all() for comparison: +{rss_mb() - before:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
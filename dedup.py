@@ -0,0 +1,415 @@
+import re
+import unicodedata
+from array import array
+from datetime import datetime
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import bindparam, delete, event, func, insert, select, update
+
+from models import (
+    db, User, Game, UserGame, PlaytimeEvent, PlaytimeRollup, GameSimilarity, game_genres,
+)
+from playtime import rebuild_rollups
+
+THRESHOLD = 0.85
+NGRAM = 3
+N_FEATURES = 2 ** 20
+# n-грами, що трапляються частіше, ніж у такої частки назв, не несуть сигналу
+# (і роздувають розріджений добуток) — відкидаємо, якщо назв достатньо
+MAX_DF = 0.05
+MIN_ROWS_FOR_MAX_DF = 1000
+CHUNK_SIZE = 2000
+# Якщо за першим словом назви кандидатів більше — звужуємо префікс до двох слів
+ADD_TIME_MAX_CANDIDATES = 5000
+
+ROMAN = {'ii': '2', 'iii': '3', 'iv': '4', 'v': '5', 'vi': '6', 'vii': '7', 'viii': '8', 'ix': '9'}
+NOISE_WORDS = {'the', 'a', 'an', 'edition', 'goty', 'definitive', 'complete', 'deluxe', 'ultimate', 'standard'}
+NOISE_PHRASES = ('game of the year',)
+SUBTITLE_SEP = re.compile(r"\s*(?::|\s-\s|\s–\s|\s—\s)\s*")
+NON_WORD = re.compile(r"[^\w\s]+")
+
+PLATFORM_FAMILIES = (
+    ('playstation', 'playstation'), ('ps', 'playstation'),
+    ('xbox', 'xbox'),
+    ('nintendo', 'nintendo'), ('switch', 'nintendo'), ('wii', 'nintendo'),
+    ('pc', 'pc'), ('windows', 'pc'), ('macos', 'pc'), ('linux', 'pc'),
+    ('ios', 'mobile'), ('android', 'mobile'), ('mobile', 'mobile'),
+)
+
+
+# -------------------- Нормалізація --------------------
+
+def _normalize(text):
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.replace('&', ' and ')
+    for phrase in NOISE_PHRASES:
+        text = text.replace(phrase, ' ')
+    tokens = NON_WORD.sub(' ', text).split()
+    return ' '.join(ROMAN.get(tok, tok) for tok in tokens if tok not in NOISE_WORDS)
+
+
+def title_keys(title):
+    # (повна назва, назва без підзаголовка): "The Witcher 3: Wild Hunt" → ("witcher 3 wild hunt", "witcher 3")
+    title = title or ''
+    full = _normalize(title)
+    base = _normalize(SUBTITLE_SEP.split(title, 1)[0])
+    return full, base or full
+
+
+def title_key(title):
+    return title_keys(title)[1][:255]
+
+
+@event.listens_for(Game.title, 'set')
+def _sync_title_key(target, value, oldvalue, initiator):
+    # Ключ для індексованого префільтра оновлюється разом із назвою
+    target.title_key = title_key(value)
+
+
+def platform_family(platform):
+    p = (platform or '').strip().lower()
+    for prefix, family in PLATFORM_FAMILIES:
+        if p.startswith(prefix):
+            return family
+    return (p or 'other')[:50]
+
+
+@event.listens_for(Game.platform, 'set')
+def _sync_platform_family(target, value, oldvalue, initiator):
+    target.platform_family = platform_family(value)
+
+
+# -------------------- Векторизація --------------------
+
+def ngram_matrix(keys, max_df=MAX_DF):
+    # Hashing trick: символьні 3-грами → розріджені TF-IDF вектори, нормовані по рядках
+    indptr = array('q', [0])
+    indices = array('q')
+    mask = N_FEATURES - 1
+    for key in keys:
+        padded = f" {key} "
+        indices.extend({hash(padded[i:i + NGRAM]) & mask for i in range(len(padded) - NGRAM + 1)})
+        indptr.append(len(indices))
+
+    n = len(keys)
+    indices = np.frombuffer(indices, dtype=np.int64)
+    m = sp.csr_matrix(
+        (np.ones(len(indices), dtype=np.float32), indices, np.frombuffer(indptr, dtype=np.int64)),
+        shape=(n, N_FEATURES),
+    )
+
+    df = np.bincount(indices, minlength=N_FEATURES)
+    idf = (np.log((1 + n) / (1 + df)) + 1).astype(np.float32)
+    if n >= MIN_ROWS_FOR_MAX_DF:
+        idf[df > max_df * n] = 0
+    m = m @ sp.diags(idf)
+    norms = np.sqrt(np.asarray(m.multiply(m).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    m = (sp.diags(1 / norms) @ m).tocsr()
+    m.eliminate_zeros()
+    return m
+
+
+def vectorize_titles(titles):
+    keys = [title_keys(t) for t in titles]
+    full = ngram_matrix([k[0] for k in keys])
+    base = ngram_matrix([k[1] for k in keys])
+    has_subtitle = np.fromiter((f != b for f, b in keys), dtype=bool, count=len(keys))
+    return full, base, has_subtitle
+
+
+def _columns(cols, full, base, has_subtitle, years):
+    # Транспоновані вектори блоку-кандидата рахуємо один раз на весь блок
+    return full[cols].T.tocsr(), base[cols].T.tocsr(), has_subtitle[cols], years[cols]
+
+
+def _pair_scores(rows, columns, full, base, has_subtitle, years, threshold):
+    # Пари (рядок, стовпець, оцінка, by_base) з оцінкою ≥ threshold. Оцінка — косинус повних назв;
+    # а якщо в однієї з назв немає підзаголовка — ще й косинус базових назв
+    # ("Witcher 3" ~ "The Witcher 3: Wild Hunt"), тоді by_base=True, якщо збіг лише через неї.
+    # Базові назви порівнюємо лише коли обидва роки відомі й різняться не більше ніж на 1:
+    # інакше "Call of Duty" без року дорівнював би кожній "Call of Duty: ..." франшизи
+    full_t, base_t, cols_have_subtitle, col_years = columns
+    s_full = (full[rows] @ full_t).tocoo()
+    s_base = (base[rows] @ base_t).tocoo()
+    row_years = years[rows][s_base.row]
+    pair_col_years = col_years[s_base.col]
+    allowed = (
+        (s_base.data >= threshold)
+        & ~(has_subtitle[rows][s_base.row] & cols_have_subtitle[s_base.col])
+        & (row_years > 0) & (pair_col_years > 0)
+        & (np.abs(row_years - pair_col_years) <= 1)
+    )
+    keep_full = s_full.data >= threshold
+    r = np.concatenate([s_full.row[keep_full], s_base.row[allowed]])
+    c = np.concatenate([s_full.col[keep_full], s_base.col[allowed]])
+    d = np.concatenate([s_full.data[keep_full], s_base.data[allowed]])
+    by_base = np.concatenate([np.zeros(keep_full.sum(), bool), np.ones(allowed.sum(), bool)])
+    # Для кожної пари — найвища оцінка; за рівності перевага повній назві
+    order = np.lexsort((by_base, -d, c, r))
+    r, c, d, by_base = r[order], c[order], d[order], by_base[order]
+    first = np.ones(len(r), bool)
+    first[1:] = (r[1:] != r[:-1]) | (c[1:] != c[:-1])
+    return r[first], c[first], d[first], by_base[first]
+
+
+def _years_array(years):
+    return np.fromiter((y or -1 for y in years), dtype=np.int64, count=len(years))
+
+
+# -------------------- Пошук дублікатів у каталозі --------------------
+
+def find_duplicate_pairs(titles, platforms, years, threshold=THRESHOLD, chunk_size=CHUNK_SIZE):
+    # Повертає (i, j, score, by_base) для i < j. Блокуємо за сімейством платформи,
+    # а всередині — за роком (±1; ігри без року порівнюються з усім блоком)
+    full, base, has_subtitle = vectorize_titles(titles)
+    families = np.array([platform_family(p) for p in platforms])
+    years = _years_array(years)
+
+    out_i, out_j, out_s, out_b = [], [], [], []
+    for family in np.unique(families):
+        block = np.flatnonzero(families == family)
+        block = block[np.argsort(years[block], kind='stable')]
+        block_years = years[block]
+        n_unknown = int(np.searchsorted(block_years, 0))
+
+        for year in np.unique(block_years):
+            lo = np.searchsorted(block_years, year, side='left')
+            hi = np.searchsorted(block_years, year, side='right')
+            if year == -1:
+                cols = block
+            else:
+                c_lo = np.searchsorted(block_years, year - 1, side='left')
+                c_hi = np.searchsorted(block_years, year + 1, side='right')
+                cols = np.concatenate([block[:n_unknown], block[max(c_lo, n_unknown):c_hi]])
+            columns = _columns(cols, full, base, has_subtitle, years)
+
+            for start in range(lo, hi, chunk_size):
+                rows = block[start:min(start + chunk_size, hi)]
+                r, c, score, by_base = _pair_scores(rows, columns, full, base, has_subtitle, years, threshold)
+                i, j = rows[r], cols[c]
+                keep = i < j
+                out_i.append(i[keep])
+                out_j.append(j[keep])
+                out_s.append(score[keep])
+                out_b.append(by_base[keep])
+
+    if not out_i:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32), np.empty(0, bool)
+    return np.concatenate(out_i), np.concatenate(out_j), np.concatenate(out_s), np.concatenate(out_b)
+
+
+def _owner_counts(game_ids):
+    return dict(db.session.execute(
+        select(UserGame.game_id, func.count()).where(UserGame.game_id.in_(game_ids)).group_by(UserGame.game_id)
+    ).all())
+
+
+def _has_subtitle(title):
+    full, base = title_keys(title)
+    return full != base
+
+
+def find_duplicate_clusters(threshold=THRESHOLD, batch_size=10000):
+    # Кластери [канонічна, дублікати...]. Будь-які два члени кластера схожі напряму —
+    # без транзитивного замикання, тож проміжна назва не зшиває франшизу
+    ids, titles, platforms, years = array('q'), [], [], []
+    stmt = select(Game.id, Game.title, Game.platform, Game.release_year)
+    for game_id, title, platform, year in db.session.execute(stmt.execution_options(yield_per=batch_size)):
+        ids.append(game_id)
+        titles.append(title)
+        platforms.append(platform)
+        years.append(year)
+    ids = np.frombuffer(ids, dtype=np.int64)
+
+    i, j, score, by_base = find_duplicate_pairs(titles, platforms, years, threshold=threshold)
+    if not len(i):
+        return []
+    year_i, year_j = _years_array(years)[i], _years_array(years)[j]
+    same_year = (year_i > 0) & (year_i == year_j)
+    pairs = list(zip(ids[i].tolist(), ids[j].tolist(), score.tolist(), by_base.tolist(), same_year.tolist()))
+    full_match = {frozenset((a, b)) for a, b, _, base_only, _ in pairs if not base_only}
+
+    # Назва без підзаголовка, що за базовою назвою схожа на кілька різних ігор
+    # ("Witcher 3" ~ "...: Wild Hunt" і "...: Blood and Wine"), — неоднозначна: її не зливаємо
+    partners = {}
+    for k in np.flatnonzero(by_base).tolist():
+        plain, subtitled = (i[k], j[k]) if not _has_subtitle(titles[i[k]]) else (j[k], i[k])
+        partners.setdefault(int(ids[plain]), set()).add(int(ids[subtitled]))
+    ambiguous = {
+        game_id for game_id, subtitled in partners.items()
+        if any(frozenset((a, b)) not in full_match for a in subtitled for b in subtitled if a < b)
+    }
+    pairs = [p for p in pairs if not (p[3] and (p[0] in ambiguous or p[1] in ambiguous))]
+
+    neighbours = {}
+    for a, b, *_ in pairs:
+        neighbours.setdefault(a, set()).add(b)
+        neighbours.setdefault(b, set()).add(a)
+
+    # Пари — від найкращої: збіг повних назв, той самий рік, вища оцінка.
+    # Кластери об'єднуються, лише якщо кожен член одного схожий на кожного члена іншого.
+    cluster_of = {}
+    for a, b, _, _, _ in sorted(pairs, key=lambda p: (p[3], not p[4], -p[2])):
+        ca, cb = cluster_of.get(a, [a]), cluster_of.get(b, [b])
+        if ca is cb or not all(y in neighbours[x] for x in ca for y in cb):
+            continue
+        merged = ca + cb
+        for game_id in merged:
+            cluster_of[game_id] = merged
+
+    # Канонічна — гра з найбільшою кількістю власників (далі — найстаріша)
+    owners = _owner_counts(list(cluster_of))
+    clusters = []
+    for cluster in {id(c): c for c in cluster_of.values()}.values():
+        clusters.append(sorted(cluster, key=lambda g: (-owners.get(g, 0), g)))
+    return sorted(clusters, key=len, reverse=True)
+
+
+# -------------------- Перевірка під час додавання --------------------
+
+def _key_prefix_filter(prefix):
+    # Ключі, що дорівнюють prefix або починаються з "prefix " — діапазон по індексу
+    # ("!" — наступний після пробілу символ, а інших символів < "!" у ключах немає)
+    return db.and_(Game.title_key >= prefix, Game.title_key < prefix + '!')
+
+
+def find_existing_game(title, platform, release_year=None, threshold=THRESHOLD):
+    # Кандидати з індексу (platform_family, title_key): те саме сімейство платформ, що й у
+    # find_duplicate_pairs ("PlayStation" ~ "PlayStation 5"), те саме перше слово
+    # нормалізованої назви, рік ±1 (або без року). Оцінюємо векторно лише цей невеликий набір — без LIMIT.
+    words = title_key(title).split()
+    if not words:
+        return None
+    stmt = select(Game.id, Game.title, Game.release_year).where(
+        Game.platform_family == platform_family(platform), _key_prefix_filter(words[0]),
+    )
+    if release_year:
+        stmt = stmt.where(db.or_(
+            Game.release_year.between(release_year - 1, release_year + 1),
+            Game.release_year.is_(None),
+        ))
+    if len(words) > 1:
+        count = db.session.scalar(select(func.count()).select_from(stmt.subquery()))
+        if count > ADD_TIME_MAX_CANDIDATES:
+            stmt = stmt.where(_key_prefix_filter(' '.join(words[:2])))
+    candidates = db.session.execute(stmt).all()
+    if not candidates:
+        return None
+
+    full, base, has_subtitle = vectorize_titles([title] + [t for _, t, _ in candidates])
+    years = _years_array([release_year] + [y for _, _, y in candidates])
+    columns = _columns(np.arange(1, len(candidates) + 1), full, base, has_subtitle, years)
+    _, cols, score, by_base = _pair_scores(np.array([0]), columns, full, base, has_subtitle, years, threshold)
+    if not len(cols):
+        return None
+    if by_base.all():
+        # Збіг лише за назвою без підзаголовка: "Witcher 3" ~ "...: Wild Hunt" і "...: Hearts of Stone" —
+        # це різні ігри, тож нічого не зв'язуємо, доки кандидати не є однією грою
+        rows = full[cols + 1]
+        if len(cols) > 1 and ((rows @ rows.T).toarray() < threshold).any():
+            return None
+    else:
+        cols, score = cols[~by_base], score[~by_base]
+    # Спершу той самий рік, далі вища оцінка
+    same_year = years[cols + 1] == (release_year or 0)
+    best = cols[np.lexsort((-score, ~same_year))[0]]
+    return db.session.get(Game, candidates[best][0])
+
+
+# -------------------- Злиття --------------------
+
+def _consolidate_links(keep_id, duplicate_ids):
+    # Один запис на користувача серед усіх ігор кластера (унікальний user_id, game_id):
+    # лишаємо запис на канонічній грі (або найстаріший), решту зливаємо в нього —
+    # години сумуються, оцінка береться найсвіжіша ненульова, події журналу переносяться
+    links = db.session.execute(
+        select(UserGame.id, UserGame.user_id, UserGame.game_id, UserGame.hours_played,
+               UserGame.rating, UserGame.updated_at)
+        .where(UserGame.game_id.in_([keep_id] + duplicate_ids))
+        .order_by(UserGame.user_id, UserGame.id)
+    ).all()
+
+    by_user = {}
+    for link in links:
+        by_user.setdefault(link.user_id, []).append(link)
+
+    survivors, moves, losers = [], [], []
+    for user_links in by_user.values():
+        if len(user_links) < 2:
+            continue
+        survivor = next((l for l in user_links if l.game_id == keep_id), user_links[0])
+        others = [l for l in user_links if l.id != survivor.id]
+        rated = sorted(
+            (l for l in others if l.rating),
+            key=lambda l: l.updated_at or datetime.min, reverse=True,
+        )
+        survivors.append({
+            'b_id': survivor.id,
+            'b_hours': sum(l.hours_played or 0 for l in user_links),
+            'b_rating': survivor.rating or (rated[0].rating if rated else survivor.rating),
+        })
+        moves.extend({'b_from': l.id, 'b_to': survivor.id} for l in others)
+        losers.extend(l.id for l in others)
+
+    if not losers:
+        return
+    user_game = UserGame.__table__
+    playtime_event = PlaytimeEvent.__table__
+    db.session.execute(
+        update(user_game).where(user_game.c.id == bindparam('b_id'))
+        .values(hours_played=bindparam('b_hours'), rating=bindparam('b_rating')),
+        survivors,
+    )
+    db.session.execute(
+        update(playtime_event).where(playtime_event.c.user_game_id == bindparam('b_from'))
+        .values(user_game_id=bindparam('b_to')),
+        moves,
+    )
+    db.session.execute(delete(PlaytimeRollup).where(PlaytimeRollup.user_game_id.in_(losers)))
+    db.session.execute(
+        delete(UserGame).where(UserGame.id.in_(losers)).execution_options(synchronize_session=False)
+    )
+    rebuild_rollups([row['b_id'] for row in survivors])
+
+
+def merge_games(keep_id, duplicate_ids):
+    # Переносимо посилання UserGame на канонічну гру пакетними UPDATE/DELETE.
+    # Якщо в користувача кілька ігор кластера, вони спершу зливаються в один запис.
+    duplicate_ids = [d for d in duplicate_ids if d != keep_id]
+    if not duplicate_ids:
+        return 0
+
+    affected_users = select(UserGame.user_id).where(UserGame.game_id.in_(duplicate_ids))
+    db.session.execute(
+        update(User).where(User.id.in_(affected_users))
+        .values(library_version=User.library_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+    _consolidate_links(keep_id, duplicate_ids)
+
+    moved = db.session.execute(
+        update(UserGame).where(UserGame.game_id.in_(duplicate_ids))
+        .values(game_id=keep_id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+    # Жанри — об'єднуємо, сусідів рекомендацій дублікатів — прибираємо
+    known_genres = select(game_genres.c.genre_id).where(game_genres.c.game_id == keep_id)
+    genre_ids = db.session.scalars(
+        select(game_genres.c.genre_id).distinct()
+        .where(game_genres.c.game_id.in_(duplicate_ids), game_genres.c.genre_id.not_in(known_genres))
+    ).all()
+    if genre_ids:
+        db.session.execute(insert(game_genres), [{'game_id': keep_id, 'genre_id': g} for g in genre_ids])
+    db.session.execute(delete(game_genres).where(game_genres.c.game_id.in_(duplicate_ids)))
+    db.session.execute(delete(GameSimilarity).where(db.or_(
+        GameSimilarity.game_id.in_(duplicate_ids), GameSimilarity.similar_game_id.in_(duplicate_ids),
+    )))
+    db.session.execute(
+        delete(Game).where(Game.id.in_(duplicate_ids)).execution_options(synchronize_session=False)
+    )
+    return moved
@@ -41,6 +41,7 @@ class ProfileForm(FlaskForm):
     username = StringField(_l("Username"), validators=[DataRequired(), Length(min=2, max=20)])
     email = StringField(_l("Email"), validators=[DataRequired(), Email()])
     avatar = FileField(_l("Profile photo"), validators=[FileAllowed(['jpg', 'jpeg', 'png', 'gif'], _l('Images only!'))])
+    is_public = BooleanField(_l("Make my library public"))
     submit = SubmitField(_l("Save"))
 
     def __init__(self, *args, **kwargs):
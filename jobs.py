@@ -0,0 +1,256 @@
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, Job
+
+VISIBILITY_TIMEOUT = 300
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 10
+BACKOFF_MAX = 3600
+POLL_INTERVAL = 1.0
+# Скільки разів за тривалість оренди її продовжує heartbeat працюючої задачі
+HEARTBEATS_PER_LEASE = 3
+
+# kind -> функція(**payload); реєструються декоратором @handler у app.py
+HANDLERS = {}
+
+
+def handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+# -------------------- Постановка в чергу --------------------
+
+def enqueue(kind, payload=None, priority=0, delay=0, max_attempts=MAX_ATTEMPTS, dedupe_key=None):
+    # Лише INSERT у поточній сесії — задача з'явиться разом із комітом запиту.
+    # Із dedupe_key повторна постановка тихо ігнорується (ON CONFLICT DO NOTHING).
+    stmt = sqlite_insert(Job).values(
+        kind=kind,
+        payload=payload or {},
+        priority=priority,
+        max_attempts=max_attempts,
+        available_at=int(time.time()) + delay,
+        dedupe_key=dedupe_key,
+    )
+    if dedupe_key:
+        stmt = stmt.on_conflict_do_nothing(index_elements=['dedupe_key'])
+    db.session.execute(stmt)
+
+
+def enqueue_periodic(schedules, now=None, due=None):
+    # Один запис на слот інтервалу: скільки б воркерів не запускало розклад,
+    # задача "kind@слот" вставиться лише раз.
+    # due (kind -> початок наступного слота) воркер тримає в пам'яті: поки межу слота
+    # не перейдено, до бази не йдемо взагалі — без запису й блокування SQLite щосекунди
+    now = int(now or time.time())
+    slots = {kind: now // interval * interval for kind, interval in schedules.items()}
+    if due is not None:
+        slots = {kind: slot for kind, slot in slots.items() if slot >= due.get(kind, 0)}
+    if not slots:
+        return
+    for kind, slot in slots.items():
+        enqueue(kind, dedupe_key=f"{kind}@{slot}")
+    db.session.commit()
+    if due is not None:
+        due.update({kind: slot + schedules[kind] for kind, slot in slots.items()})
+
+
+# -------------------- Забір / завершення --------------------
+
+def claim(worker_id, visibility_timeout=VISIBILITY_TIMEOUT, now=None):
+    # Атомарно: вибір найпріоритетнішої доступної задачі й оренда — одним UPDATE ... RETURNING.
+    # 'running' із простроченою орендою теж доступна — її воркер, схоже, помер.
+    now = int(now or time.time())
+    next_id = (
+        select(Job.id)
+        .where(Job.status.in_(('queued', 'running')), Job.available_at <= now)
+        .order_by(Job.priority.desc(), Job.available_at, Job.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    row = db.session.execute(
+        update(Job)
+        .where(Job.id == next_id)
+        .values(
+            status='running',
+            attempts=Job.attempts + 1,
+            available_at=now + visibility_timeout,
+            locked_by=worker_id,
+        )
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+        .execution_options(synchronize_session=False)
+    ).first()
+    db.session.commit()
+    return row
+
+
+def _finish(job, **values):
+    # attempts — "жетон" оренди: якщо задачу вже перехопив інший воркер, нічого не змінюємо
+    result = db.session.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.attempts == job.attempts, Job.status == 'running')
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def complete(job):
+    return _finish(job, status='done', finished_at=int(time.time()), last_error=None)
+
+
+def backoff(attempts):
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return int(delay + random.uniform(0, delay / 10))
+
+
+def fail(job, error):
+    now = int(time.time())
+    if job.attempts >= job.max_attempts:
+        return _finish(job, status='failed', finished_at=now, last_error=error)
+    return _finish(job, status='queued', available_at=now + backoff(job.attempts), last_error=error)
+
+
+def _heartbeat(engine, job, visibility_timeout, stop):
+    # Окреме з'єднання: сесія обробника може тримати свою транзакцію скільки завгодно
+    while not stop.wait(visibility_timeout / HEARTBEATS_PER_LEASE):
+        try:
+            with engine.begin() as conn:
+                extended = conn.execute(
+                    update(Job)
+                    .where(Job.id == job.id, Job.attempts == job.attempts, Job.status == 'running')
+                    .values(available_at=int(time.time()) + visibility_timeout)
+                ).rowcount
+        except Exception:
+            continue  # напр. "database is locked" — продовжимо на наступному такті
+        if not extended:
+            return  # оренду вже перехопили — продовжувати нічого
+
+
+@contextmanager
+def _keep_lease(job, visibility_timeout):
+    # Довга задача (повний rebuild, великий rollup) не "протухає" посеред роботи:
+    # поки обробник живий, available_at відсувається (з тим самим жетоном attempts, що й _finish)
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(db.engine, job, visibility_timeout, stop), daemon=True)
+    beat.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        beat.join()
+
+
+def run_one(worker_id, visibility_timeout=VISIBILITY_TIMEOUT):
+    job = claim(worker_id, visibility_timeout)
+    if job is None:
+        return None
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError("visibility timeout expired on the last attempt")
+        fn = HANDLERS.get(job.kind)
+        if fn is None:
+            raise LookupError(f"no handler for job kind {job.kind!r}")
+        with _keep_lease(job, visibility_timeout):
+            fn(**job.payload)
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        fail(job, traceback.format_exc(limit=5))
+    else:
+        complete(job)
+    finally:
+        db.session.remove()
+    return job
+
+
+# -------------------- Воркер --------------------
+
+def _work_loop(app, worker_id, stop):
+    with app.app_context():
+        visibility_timeout = app.config.get('JOB_VISIBILITY_TIMEOUT', VISIBILITY_TIMEOUT)
+        poll = app.config.get('JOB_POLL_INTERVAL', POLL_INTERVAL)
+        while not stop.is_set():
+            try:
+                job = run_one(worker_id, visibility_timeout)
+            except Exception:
+                # напр. "database is locked" — не падаємо, пробуємо згодом
+                db.session.rollback()
+                job = None
+            if job is None:
+                stop.wait(poll)
+
+
+def _process_main(app, worker_id):
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    with app.app_context():
+        db.engine.dispose(close=False)  # з'єднання батьківського процесу не використовуємо
+    _work_loop(app, worker_id, stop)
+
+
+def run_worker(app, concurrency=1, mode='thread', schedules=None):
+    # Головний потік лише ставить періодичні задачі; роботу виконують потоки або процеси
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    if mode == 'process':
+        ctx = multiprocessing.get_context('fork')
+        workers = [ctx.Process(target=_process_main, args=(app, f"{base_id}/p{i}"), daemon=True)
+                   for i in range(concurrency)]
+    else:
+        workers = [threading.Thread(target=_work_loop, args=(app, f"{base_id}/t{i}", stop), daemon=True)
+                   for i in range(concurrency)]
+    for w in workers:
+        w.start()
+
+    poll = app.config.get('JOB_POLL_INTERVAL', POLL_INTERVAL)
+    due = {}
+    with app.app_context():
+        while not stop.is_set():
+            if schedules:
+                try:
+                    enqueue_periodic(schedules, due=due)
+                except Exception:
+                    db.session.rollback()
+            stop.wait(poll)
+
+    if mode == 'process':
+        for w in workers:
+            w.terminate()  # SIGTERM — процес доробить поточну задачу й вийде
+    for w in workers:
+        w.join()
+
+
+# -------------------- Обслуговування --------------------
+
+def purge(older_than_days):
+    cutoff = int(time.time()) - older_than_days * 86400
+    removed = db.session.execute(
+        delete(Job).where(Job.status.in_(('done', 'failed')), Job.finished_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    return removed
+
+
+def stats():
+    return db.session.execute(
+        select(Job.kind, Job.status, func.count()).group_by(Job.kind, Job.status).order_by(Job.kind, Job.status)
+    ).all()
@@ -0,0 +1,37 @@
+"""Add game_similarity for recommendations
+
+Revision ID: 5b9e04c7a3d1
+Revises: c41e7d0a5f92
+Create Date: 2026-10-19 14:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b9e04c7a3d1'
+down_revision = 'c41e7d0a5f92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('game_similarity',
+    sa.Column('game_id', sa.Integer(), nullable=False),
+    sa.Column('similar_game_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['game_id'], ['game.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['similar_game_id'], ['game.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('game_id', 'similar_game_id')
+    )
+    with op.batch_alter_table('game_similarity', schema=None) as batch_op:
+        batch_op.create_index('ix_game_similarity_game_score', ['game_id', 'score', 'similar_game_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('game_similarity', schema=None) as batch_op:
+        batch_op.drop_index('ix_game_similarity_game_score')
+
+    op.drop_table('game_similarity')
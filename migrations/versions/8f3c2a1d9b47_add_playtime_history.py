@@ -0,0 +1,77 @@
+"""Add playtime history (events + rollups)
+
+Revision ID: 8f3c2a1d9b47
+Revises: 2761b80c80aa
+Create Date: 2026-10-19 12:10:00.000000
+
+"""
+import calendar
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3c2a1d9b47'
+down_revision = '2761b80c80aa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('playtime_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_game_id', sa.Integer(), nullable=False),
+    sa.Column('ts', sa.Integer(), nullable=False),
+    sa.Column('minutes_delta', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_game_id'], ['user_game.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('playtime_event', schema=None) as batch_op:
+        batch_op.create_index('ix_playtime_event_user_game_ts', ['user_game_id', 'ts', 'minutes_delta'], unique=False)
+
+    op.create_table('playtime_rollup',
+    sa.Column('user_game_id', sa.Integer(), nullable=False),
+    sa.Column('period', sa.String(length=5), nullable=False),
+    sa.Column('bucket', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('minutes_delta', sa.Integer(), nullable=False),
+    sa.Column('last_event_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_game_id'], ['user_game.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_game_id', 'period', 'bucket')
+    )
+    with op.batch_alter_table('playtime_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_playtime_rollup_user_period_bucket', ['user_id', 'period', 'bucket'], unique=False)
+
+    # Стартова точка історії: поточне значення hours_played як одна подія
+    conn = op.get_bind()
+    user_game = sa.table('user_game',
+        sa.column('id', sa.Integer), sa.column('hours_played', sa.Integer), sa.column('updated_at', sa.DateTime))
+    playtime_event = sa.table('playtime_event',
+        sa.column('user_game_id', sa.Integer), sa.column('ts', sa.Integer), sa.column('minutes_delta', sa.Integer))
+
+    rows = conn.execute(
+        sa.select(user_game.c.id, user_game.c.hours_played, user_game.c.updated_at)
+        .where(user_game.c.hours_played > 0)
+    )
+    batch = []
+    for user_game_id, hours, updated_at in rows:
+        ts = calendar.timegm(updated_at.utctimetuple()) if updated_at else 0
+        batch.append({'user_game_id': user_game_id, 'ts': ts, 'minutes_delta': round(hours * 60)})
+        if len(batch) >= 1000:
+            conn.execute(playtime_event.insert(), batch)
+            batch = []
+    if batch:
+        conn.execute(playtime_event.insert(), batch)
+
+
+def downgrade():
+    with op.batch_alter_table('playtime_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_playtime_rollup_user_period_bucket')
+
+    op.drop_table('playtime_rollup')
+    with op.batch_alter_table('playtime_event', schema=None) as batch_op:
+        batch_op.drop_index('ix_playtime_event_user_game_ts')
+
+    op.drop_table('playtime_event')
@@ -0,0 +1,139 @@
+"""Add unique (user_id, game_id) and missing indexes found by the slow-query log
+
+Revision ID: 9a6d3e1f7c20
+Revises: e27d5f8a61c3
+Create Date: 2026-10-19 16:30:00.000000
+
+"""
+from datetime import datetime
+from itertools import groupby
+
+from alembic import op
+import sqlalchemy as sa
+
+# Межі інтервалів мають збігатися з агрегатором, тож беремо саму функцію, а не копію
+from playtime import PERIODS, bucket_start
+
+
+# revision identifiers, used by Alembic.
+revision = '9a6d3e1f7c20'
+down_revision = 'e27d5f8a61c3'
+branch_labels = None
+depends_on = None
+
+user_game = sa.table(
+    'user_game',
+    sa.column('id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('game_id', sa.Integer),
+    sa.column('hours_played', sa.Integer),
+    sa.column('rating', sa.Integer),
+    sa.column('updated_at', sa.DateTime),
+)
+playtime_event = sa.table(
+    'playtime_event',
+    sa.column('id', sa.Integer),
+    sa.column('user_game_id', sa.Integer),
+    sa.column('ts', sa.Integer),
+    sa.column('minutes_delta', sa.Integer),
+)
+playtime_rollup = sa.table(
+    'playtime_rollup',
+    sa.column('user_game_id', sa.Integer),
+    sa.column('user_id', sa.Integer),
+    sa.column('period', sa.String),
+    sa.column('bucket', sa.Integer),
+    sa.column('minutes_delta', sa.Integer),
+    sa.column('last_event_id', sa.Integer),
+)
+
+
+def _fold_duplicates(conn):
+    # Дублікати (user_id, game_id) зливаємо в найстаріший запис, як dedup._consolidate_links:
+    # години сумуються, оцінка — своя або найсвіжіша ненульова, події журналу переносяться
+    duplicated = (
+        sa.select(user_game.c.user_id, user_game.c.game_id)
+        .group_by(user_game.c.user_id, user_game.c.game_id)
+        .having(sa.func.count() > 1)
+    )
+    rows = conn.execute(
+        sa.select(user_game)
+        .where(sa.tuple_(user_game.c.user_id, user_game.c.game_id).in_(duplicated))
+        .order_by(user_game.c.user_id, user_game.c.game_id, user_game.c.id)
+    ).all()
+
+    survivors, moves, losers = [], [], []
+    for _, links in groupby(rows, key=lambda r: (r.user_id, r.game_id)):
+        survivor, *others = links
+        rated = [l for l in others if l.rating]
+        rated.sort(key=lambda l: l.updated_at or datetime.min, reverse=True)
+        survivors.append({
+            'b_id': survivor.id,
+            'b_user_id': survivor.user_id,
+            'b_hours': sum(l.hours_played or 0 for l in [survivor] + others),
+            'b_rating': survivor.rating or (rated[0].rating if rated else survivor.rating),
+        })
+        moves.extend({'b_from': l.id, 'b_to': survivor.id} for l in others)
+        losers.extend(l.id for l in others)
+    if not losers:
+        return
+
+    conn.execute(
+        sa.update(user_game).where(user_game.c.id == sa.bindparam('b_id'))
+        .values(hours_played=sa.bindparam('b_hours'), rating=sa.bindparam('b_rating')),
+        survivors,
+    )
+    conn.execute(
+        sa.update(playtime_event).where(playtime_event.c.user_game_id == sa.bindparam('b_from'))
+        .values(user_game_id=sa.bindparam('b_to')),
+        moves,
+    )
+    survivor_ids = [s['b_id'] for s in survivors]
+    conn.execute(sa.delete(playtime_rollup).where(playtime_rollup.c.user_game_id.in_(losers + survivor_ids)))
+    conn.execute(sa.delete(user_game).where(user_game.c.id.in_(losers)))
+
+    # Агрегати тих, куди перенесли події, — з нуля до поточного водяного знака
+    # (як playtime.rebuild_rollups); якщо агрегатор ще не запускався, перший запуск усе порахує
+    watermark = conn.scalar(sa.select(sa.func.max(playtime_rollup.c.last_event_id))) or 0
+    if not watermark:
+        return
+    values = []
+    for s in survivors:
+        acc = {}
+        events = conn.execute(
+            sa.select(playtime_event.c.ts, playtime_event.c.minutes_delta)
+            .where(playtime_event.c.user_game_id == s['b_id'], playtime_event.c.id <= watermark)
+        )
+        for ts, minutes in events:
+            for period in PERIODS:
+                key = (period, bucket_start(period, ts))
+                acc[key] = acc.get(key, 0) + minutes
+        values.extend(
+            {'user_game_id': s['b_id'], 'user_id': s['b_user_id'], 'period': period, 'bucket': bucket,
+             'minutes_delta': minutes, 'last_event_id': watermark}
+            for (period, bucket), minutes in acc.items()
+        )
+    if values:
+        conn.execute(sa.insert(playtime_rollup), values)
+
+
+def upgrade():
+    # Наявні дублікати зливаємо (нічого не губимо), інакше обмеження не створиться
+    _fold_duplicates(op.get_bind())
+
+    with op.batch_alter_table('user_game', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_user_game_user_id_game_id', ['user_id', 'game_id'])
+        batch_op.create_index(batch_op.f('ix_user_game_game_id'), ['game_id'], unique=False)
+
+    # MAX(last_event_id) — водяний знак агрегатора, без індексу проходить усю таблицю
+    with op.batch_alter_table('playtime_rollup', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_playtime_rollup_last_event_id'), ['last_event_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('playtime_rollup', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_playtime_rollup_last_event_id'))
+
+    with op.batch_alter_table('user_game', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_game_game_id'))
+        batch_op.drop_constraint('uq_user_game_user_id_game_id', type_='unique')
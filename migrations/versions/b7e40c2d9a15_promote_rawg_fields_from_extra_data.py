@@ -0,0 +1,124 @@
+"""Promote RAWG fields out of game.extra_data into typed columns
+
+Revision ID: b7e40c2d9a15
+Revises: 3c8b51d2f604
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e40c2d9a15'
+down_revision = '3c8b51d2f604'
+branch_labels = None
+depends_on = None
+
+# Рядків на одну коротку транзакцію бекфілу — таблиця не блокується надовго
+BATCH_SIZE = 1000
+
+game = sa.table(
+    'game',
+    sa.column('id', sa.Integer),
+    sa.column('extra_data', sa.JSON),
+    sa.column('slug', sa.String),
+    sa.column('released', sa.Date),
+    sa.column('metacritic', sa.Integer),
+    sa.column('rawg_rating', sa.Float),
+    sa.column('background_image', sa.String),
+)
+
+
+def _number(kind, value):
+    try:
+        return kind(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _promoted(data):
+    # Копія логіки Game.apply_rawg на момент міграції (модель може змінитися)
+    try:
+        released = date.fromisoformat(data['released']) if data.get('released') else None
+    except (TypeError, ValueError):
+        released = None
+    slug, image = data.get('slug'), data.get('background_image')
+    return {
+        'b_slug': slug[:255] if isinstance(slug, str) else None,
+        'b_released': released,
+        'b_metacritic': _number(int, data.get('metacritic')),
+        'b_rawg_rating': _number(float, data.get('rating')),
+        'b_background_image': image[:500] if isinstance(image, str) else None,
+    }
+
+
+def _backfill(conn):
+    # Keyset-пагінація по id: читаємо пачку, оновлюємо її однією executemany
+    # у власній транзакції, і так далі — без одного довгого запису на всю таблицю
+    stmt = (
+        sa.update(game)
+        .where(game.c.id == sa.bindparam('b_id'))
+        .values(
+            slug=sa.bindparam('b_slug'),
+            released=sa.bindparam('b_released'),
+            metacritic=sa.bindparam('b_metacritic'),
+            rawg_rating=sa.bindparam('b_rawg_rating'),
+            background_image=sa.bindparam('b_background_image'),
+        )
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(game.c.id, game.c.extra_data)
+            .where(game.c.id > last_id, game.c.extra_data.isnot(None))
+            .order_by(game.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        values = [
+            {'b_id': game_id, **_promoted(data)}
+            for game_id, data in rows
+            if isinstance(data, dict)
+        ]
+        if values:
+            conn.exec_driver_sql("BEGIN")
+            conn.execute(stmt, values)
+            conn.exec_driver_sql("COMMIT")
+        last_id = rows[-1].id
+
+
+def upgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('slug', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('released', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('metacritic', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('rawg_rating', sa.Float(), nullable=True))
+        batch_op.add_column(sa.Column('background_image', sa.String(length=500), nullable=True))
+
+    with op.get_context().autocommit_block():
+        _backfill(op.get_bind())
+
+    # Індекси — після бекфілу: одна побудова замість оновлення на кожен рядок
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_game_metacritic'), ['metacritic'], unique=False)
+        batch_op.create_index(batch_op.f('ix_game_rawg_rating'), ['rawg_rating'], unique=False)
+        batch_op.create_index(batch_op.f('ix_game_released'), ['released'], unique=False)
+        batch_op.create_index(batch_op.f('ix_game_slug'), ['slug'], unique=False)
+
+
+def downgrade():
+    # Дані лишаються в extra_data, тож колонки можна просто прибрати
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_game_slug'))
+        batch_op.drop_index(batch_op.f('ix_game_released'))
+        batch_op.drop_index(batch_op.f('ix_game_rawg_rating'))
+        batch_op.drop_index(batch_op.f('ix_game_metacritic'))
+        batch_op.drop_column('background_image')
+        batch_op.drop_column('rawg_rating')
+        batch_op.drop_column('metacritic')
+        batch_op.drop_column('released')
+        batch_op.drop_column('slug')
@@ -0,0 +1,28 @@
+"""Add public library flag and version to User
+
+Revision ID: c41e7d0a5f92
+Revises: 8f3c2a1d9b47
+Create Date: 2026-10-19 13:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7d0a5f92'
+down_revision = '8f3c2a1d9b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('is_public', sa.Boolean(), server_default=sa.false(), nullable=False))
+        batch_op.add_column(sa.Column('library_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('library_version')
+        batch_op.drop_column('is_public')
@@ -0,0 +1,68 @@
+"""Add game.title_key for the indexed add-time duplicate prefilter
+
+Revision ID: d52a8f1c6e07
+Revises: b7e40c2d9a15
+Create Date: 2026-10-19 20:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Ключ має збігатися з тим, що пише застосунок, тож беремо саму функцію, а не копію
+from dedup import title_key
+
+
+# revision identifiers, used by Alembic.
+revision = 'd52a8f1c6e07'
+down_revision = 'b7e40c2d9a15'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+game = sa.table(
+    'game',
+    sa.column('id', sa.Integer),
+    sa.column('title', sa.String),
+    sa.column('title_key', sa.String),
+)
+
+
+def _backfill(conn):
+    # Як і в b7e40c2d9a15: keyset-пагінація по id, кожна пачка — окрема коротка транзакція
+    stmt = (
+        sa.update(game)
+        .where(game.c.id == sa.bindparam('b_id'))
+        .values(title_key=sa.bindparam('b_title_key'))
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(game.c.id, game.c.title)
+            .where(game.c.id > last_id)
+            .order_by(game.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.exec_driver_sql("BEGIN")
+        conn.execute(stmt, [{'b_id': game_id, 'b_title_key': title_key(title)} for game_id, title in rows])
+        conn.exec_driver_sql("COMMIT")
+        last_id = rows[-1].id
+
+
+def upgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('title_key', sa.String(length=255), nullable=True))
+
+    with op.get_context().autocommit_block():
+        _backfill(op.get_bind())
+
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.create_index('ix_game_platform_title_key', ['platform', 'title_key', 'release_year'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_index('ix_game_platform_title_key')
+        batch_op.drop_column('title_key')
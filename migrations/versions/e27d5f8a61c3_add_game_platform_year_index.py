@@ -0,0 +1,26 @@
+"""Add (platform, release_year) index to Game
+
+Revision ID: e27d5f8a61c3
+Revises: 5b9e04c7a3d1
+Create Date: 2026-10-19 15:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e27d5f8a61c3'
+down_revision = '5b9e04c7a3d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.create_index('ix_game_platform_release_year', ['platform', 'release_year'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_index('ix_game_platform_release_year')
@@ -0,0 +1,72 @@
+"""Add game.platform_family and block the add-time prefilter by it
+
+Revision ID: e81f4b7a2c39
+Revises: d52a8f1c6e07
+Create Date: 2026-10-19 22:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Сімейство має збігатися з тим, що пише застосунок, тож беремо саму функцію, а не копію
+from dedup import platform_family
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81f4b7a2c39'
+down_revision = 'd52a8f1c6e07'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+game = sa.table(
+    'game',
+    sa.column('id', sa.Integer),
+    sa.column('platform', sa.String),
+    sa.column('platform_family', sa.String),
+)
+
+
+def _backfill(conn):
+    # Як і в d52a8f1c6e07: keyset-пагінація по id, кожна пачка — окрема коротка транзакція
+    stmt = (
+        sa.update(game)
+        .where(game.c.id == sa.bindparam('b_id'))
+        .values(platform_family=sa.bindparam('b_platform_family'))
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            sa.select(game.c.id, game.c.platform)
+            .where(game.c.id > last_id)
+            .order_by(game.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        conn.exec_driver_sql("BEGIN")
+        conn.execute(stmt, [{'b_id': game_id, 'b_platform_family': platform_family(platform)}
+                            for game_id, platform in rows])
+        conn.exec_driver_sql("COMMIT")
+        last_id = rows[-1].id
+
+
+def upgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('platform_family', sa.String(length=50), nullable=True))
+
+    with op.get_context().autocommit_block():
+        _backfill(op.get_bind())
+
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_index('ix_game_platform_title_key')
+        batch_op.create_index('ix_game_platform_family_title_key',
+                              ['platform_family', 'title_key', 'release_year'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_index('ix_game_platform_family_title_key')
+        batch_op.create_index('ix_game_platform_title_key', ['platform', 'title_key', 'release_year'], unique=False)
+        batch_op.drop_column('platform_family')
@@ -1,4 +1,5 @@
-from datetime import datetime
+import time
+from datetime import date, datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -22,6 +23,9 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     avatar = db.Column(db.String(255))
+    is_public = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # Збільшується при кожній зміні публічно видимих даних (див. page_cache.py)
+    library_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
     # Зв'язок з UserGame
     games = db.relationship("UserGame", back_populates="user", cascade="all, delete-orphan")
@@ -38,25 +42,68 @@ class User(UserMixin, db.Model):
 
 class Game(db.Model):
     __tablename__ = "game"
+    __table_args__ = (
+        # блок кандидатів для перевірки дублікатів під час додавання
+        db.Index("ix_game_platform_release_year", "platform", "release_year"),
+        # префільтр кандидатів за першим словом нормалізованої назви (див. dedup.find_existing_game)
+        db.Index("ix_game_platform_family_title_key", "platform_family", "title_key", "release_year"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False, index=True)
+    title_key = db.Column(db.String(255))  # нормалізована назва без підзаголовка, заповнює dedup.py
     release_year = db.Column(db.Integer)
     platform = db.Column(db.String(50), nullable=False)
+    platform_family = db.Column(db.String(50))  # "PlayStation 5" → "playstation", заповнює dedup.py
     rating = db.Column(db.Float)
     hours_played = db.Column(db.Float)
     cover = db.Column(db.String(255))  # filename або зовнішній URL
-    extra_data = db.Column(db.JSON)      # додаткові поля від API (dict)
+    # Повний payload від API (dict) — важкий, тому не вантажиться разом із рядком;
+    # потрібні поля винесено в окремі колонки нижче (див. apply_rawg)
+    extra_data = db.deferred(db.Column(db.JSON))
+    slug = db.Column(db.String(255), index=True)
+    released = db.Column(db.Date, index=True)
+    metacritic = db.Column(db.Integer, index=True)
+    rawg_rating = db.Column(db.Float, index=True)  # `rating` — наша власна оцінка
+    background_image = db.Column(db.String(500))
     steam_appid = db.Column(db.Integer, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     genres = db.relationship("Genre", secondary=game_genres, back_populates="games")
     user_links = db.relationship("UserGame", back_populates="game", cascade="all, delete-orphan")
 
+    def apply_rawg(self, data):
+        # Зберігаємо payload RAWG і синхронізуємо винесені з нього колонки
+        self.extra_data = data
+        # Ті самі перевірки, що й у бекфілі міграції b7e40c2d9a15
+        self.slug = _text(data.get('slug'), 255)
+        self.released = _parse_date(data.get('released'))
+        self.metacritic = _to_number(int, data.get('metacritic'))
+        self.rawg_rating = _to_number(float, data.get('rating'))
+        self.background_image = _text(data.get('background_image'), 500)
+
     def __repr__(self):
         return f"<Game {self.title}>"
 
 
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(value, max_length):
+    return value[:max_length] if isinstance(value, str) else None
+
+
+def _to_number(kind, value):
+    try:
+        return kind(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
 class Genre(db.Model):
     __tablename__ = "genre"
 
@@ -71,10 +118,14 @@ class Genre(db.Model):
 
 class UserGame(db.Model):
     __tablename__ = "user_game"
+    __table_args__ = (
+        # одна гра — один раз у бібліотеці; заодно індекс для filter_by(user_id=...)
+        db.UniqueConstraint("user_id", "game_id", name="uq_user_game_user_id_game_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    game_id = db.Column(db.Integer, db.ForeignKey("game.id"), nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey("game.id"), nullable=False, index=True)
     hours_played = db.Column(db.Integer, default=0)
     rating = db.Column(db.Integer)  # 1–10 або null
     imported_from = db.Column(db.String(64))  # 'steam', 'manual', 'csv'
@@ -82,6 +133,99 @@ class UserGame(db.Model):
 
     user = db.relationship("User", back_populates="games")
     game = db.relationship("Game", back_populates="user_links")
+    playtime_events = db.relationship(
+        "PlaytimeEvent", back_populates="user_game",
+        cascade="all, delete-orphan", lazy="dynamic",
+    )
+    playtime_rollups = db.relationship("PlaytimeRollup", cascade="all, delete-orphan", lazy="dynamic")
+
+    def set_hours_played(self, hours):
+        # Замість перезапису — дописуємо дельту в журнал (у хвилинах)
+        hours = hours or 0
+        delta = round((hours - (self.hours_played or 0)) * 60)
+        self.hours_played = hours
+        if delta:
+            self.playtime_events.append(PlaytimeEvent(ts=int(time.time()), minutes_delta=delta))
+
+    def __repr__(self):
+        return f"<UserGame {self.user_id} ↔ {self.game_id}>"
+
+
+# Append-only журнал змін наігрованого часу: лише unix-час і дельта в хвилинах.
+# Покривний індекс (user_game_id, ts, minutes_delta) — графік читається з самого індексу.
+class PlaytimeEvent(db.Model):
+    __tablename__ = "playtime_event"
+    __table_args__ = (
+        db.Index("ix_playtime_event_user_game_ts", "user_game_id", "ts", "minutes_delta"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_game_id = db.Column(db.Integer, db.ForeignKey("user_game.id", ondelete="CASCADE"), nullable=False)
+    ts = db.Column(db.Integer, nullable=False)             # unix seconds (UTC)
+    minutes_delta = db.Column(db.Integer, nullable=False)  # +/- хвилини відносно попереднього значення
+
+    user_game = db.relationship("UserGame", back_populates="playtime_events")
+
+    def __repr__(self):
+        return f"<PlaytimeEvent {self.user_game_id} @{self.ts} {self.minutes_delta:+d}>"
+
+
+# Агрегати журналу по днях/тижнях/місяцях (заповнюються `flask playtime rollup`)
+class PlaytimeRollup(db.Model):
+    __tablename__ = "playtime_rollup"
+    __table_args__ = (
+        db.Index("ix_playtime_rollup_user_period_bucket", "user_id", "period", "bucket"),
+    )
+
+    user_game_id = db.Column(db.Integer, db.ForeignKey("user_game.id", ondelete="CASCADE"), primary_key=True)
+    period = db.Column(db.String(5), primary_key=True)   # 'day' | 'week' | 'month'
+    bucket = db.Column(db.Integer, primary_key=True)     # unix-час початку інтервалу
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False)
+    minutes_delta = db.Column(db.Integer, nullable=False)
+    last_event_id = db.Column(db.Integer, nullable=False, index=True)  # водяний знак для інкрементального перерахунку
+
+    def __repr__(self):
+        return f"<PlaytimeRollup {self.user_game_id} {self.period}@{self.bucket}>"
+
+# Top-K схожих ігор (item-item), перераховується офлайн `flask recommendations build`
+class GameSimilarity(db.Model):
+    __tablename__ = "game_similarity"
+    __table_args__ = (
+        db.Index("ix_game_similarity_game_score", "game_id", "score", "similar_game_id"),
+    )
+
+    game_id = db.Column(db.Integer, db.ForeignKey("game.id", ondelete="CASCADE"), primary_key=True)
+    similar_game_id = db.Column(db.Integer, db.ForeignKey("game.id", ondelete="CASCADE"), primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<GameSimilarity {self.game_id} → {self.similar_game_id} {self.score:.3f}>"
+
+
+# Фонові задачі (черга в самій БД, див. jobs.py). Забирає задачу воркер атомарним
+# UPDATE ... RETURNING: status -> 'running', available_at -> now + visibility timeout.
+# Якщо воркер помер, задача знову стає доступною, коли available_at мине.
+class Job(db.Model):
+    __tablename__ = "job"
+    __table_args__ = (
+        db.Index("ix_job_claim", "status", "priority", "available_at"),
+        db.UniqueConstraint("dedupe_key", name="uq_job_dedupe_key"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    priority = db.Column(db.Integer, nullable=False, default=0)       # більше — раніше
+    status = db.Column(db.String(10), nullable=False, default="queued")  # queued | running | done | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    available_at = db.Column(db.Integer, nullable=False)               # unix-час, коли задачу можна забрати
+    locked_by = db.Column(db.String(64))
+    last_error = db.Column(db.Text)
+    dedupe_key = db.Column(db.String(128))                             # для періодичних задач: kind@слот
+    created_at = db.Column(db.Integer, nullable=False, default=lambda: int(time.time()))
+    finished_at = db.Column(db.Integer)
 
     def __repr__(self):
-        return f"<UserGame {self.user_id} ↔ {self.game_id}>"
\ No newline at end of file
+        return f"<Job {self.id} {self.kind} {self.status}>"
@@ -0,0 +1,78 @@
+import threading
+from collections import OrderedDict
+from itertools import chain
+
+from sqlalchemy import event, inspect, select, update
+from sqlalchemy.orm import Session
+
+from models import User, Game, UserGame
+
+# Поля профілю, що видно на публічній сторінці (email туди не потрапляє)
+PUBLIC_USER_FIELDS = ('username', 'avatar', 'is_public')
+PUBLIC_GAME_FIELDS = ('title', 'platform', 'release_year', 'cover')
+
+
+class PageCache:
+    # Кеш готових HTML-сторінок: user_id -> (library_version, {locale: html}).
+    # Ключ містить версію бібліотеки, тож застарілі сторінки просто не знаходяться,
+    # а LRU по користувачах обмежує пам'ять.
+
+    def __init__(self, max_users=1024):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version, locale):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1].get(locale)
+
+    def set(self, user_id, version, locale, html):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                entry = (version, {})
+                self._entries[user_id] = entry
+            entry[1][locale] = html
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+
+def _changed(obj, fields):
+    attrs = inspect(obj).attrs
+    return any(attrs[name].history.has_changes() for name in fields)
+
+
+@event.listens_for(Session, "before_flush")
+def bump_library_versions(session, flush_context, instances):
+    # Будь-яка зміна UserGame / видимих полів профілю / спільного Game
+    # збільшує library_version власників — це і є точкова інвалідація
+    user_ids = set()
+    game_ids = set()
+
+    for obj in chain(session.new, session.deleted):
+        if isinstance(obj, UserGame):
+            user_ids.add(obj.user_id)
+    for obj in session.dirty:
+        if isinstance(obj, UserGame) and session.is_modified(obj):
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, User) and _changed(obj, PUBLIC_USER_FIELDS):
+            user_ids.add(obj.id)
+        elif isinstance(obj, Game) and obj.id is not None and _changed(obj, PUBLIC_GAME_FIELDS):
+            game_ids.add(obj.id)
+
+    if game_ids:
+        user_ids.update(session.connection().scalars(
+            select(UserGame.user_id).where(UserGame.game_id.in_(game_ids))
+        ))
+    user_ids.discard(None)
+    if user_ids:
+        session.connection().execute(
+            update(User.__table__)
+            .where(User.__table__.c.id.in_(user_ids))
+            .values(library_version=User.__table__.c.library_version + 1)
+        )
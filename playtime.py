@@ -0,0 +1,160 @@
+import calendar
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func, insert, select
+
+from models import db, UserGame, PlaytimeEvent, PlaytimeRollup
+
+# Періоди агрегації — від дрібного до крупного
+PERIODS = ('day', 'week', 'month')
+
+DAY = 24 * 60 * 60
+WEEK = 7 * DAY
+MONDAY_OFFSET = 4 * DAY  # 1970-01-01 — четвер, тижні рахуємо з понеділка
+
+CHART_MAX_POINTS = 120
+
+
+def bucket_start(period, ts):
+    if period == 'day':
+        return ts - ts % DAY
+    if period == 'week':
+        return ts - (ts - MONDAY_OFFSET) % WEEK
+    d = datetime.fromtimestamp(ts, timezone.utc)
+    return calendar.timegm((d.year, d.month, 1, 0, 0, 0))
+
+
+def _watermark():
+    return db.session.scalar(select(func.max(PlaytimeRollup.last_event_id))) or 0
+
+
+# -------------------- Агрегація (фонова) --------------------
+
+def rollup_playtime(batch_size=1000):
+    # Перераховуємо лише ті інтервали, куди потрапили нові події (watermark < id <= upper).
+    # Верхню межу фіксуємо один раз: події, що з'являться під час перерахунку,
+    # не потраплять у цей запуск і не "перескочать" водяний знак — їх візьме наступний.
+    watermark = _watermark()
+    upper = db.session.scalar(select(func.max(PlaytimeEvent.id))) or 0
+    if upper <= watermark:
+        return 0
+    changed = db.session.execute(
+        select(PlaytimeEvent.user_game_id, UserGame.user_id, func.min(PlaytimeEvent.ts))
+        .join(UserGame, UserGame.id == PlaytimeEvent.user_game_id)
+        .where(PlaytimeEvent.id > watermark, PlaytimeEvent.id <= upper)
+        .group_by(PlaytimeEvent.user_game_id, UserGame.user_id)
+    ).all()
+
+    for user_game_id, user_id, min_ts in changed:
+        _rollup_user_game(user_game_id, user_id, min_ts, upper, batch_size)
+    db.session.commit()
+    return len(changed)
+
+
+def _rollup_user_game(user_game_id, user_id, min_ts, upper, batch_size):
+    starts = {period: bucket_start(period, min_ts) for period in PERIODS}
+    for period, start in starts.items():
+        db.session.execute(
+            delete(PlaytimeRollup).where(
+                PlaytimeRollup.user_game_id == user_game_id,
+                PlaytimeRollup.period == period,
+                PlaytimeRollup.bucket >= start,
+            )
+        )
+
+    acc = {}  # (period, bucket) -> minutes
+    events = db.session.execute(
+        select(PlaytimeEvent.ts, PlaytimeEvent.minutes_delta)
+        .where(
+            PlaytimeEvent.user_game_id == user_game_id,
+            PlaytimeEvent.ts >= min(starts.values()),
+            PlaytimeEvent.id <= upper,
+        )
+        .execution_options(yield_per=batch_size)
+    )
+    for ts, minutes in events:
+        for period, start in starts.items():
+            if ts >= start:
+                key = (period, bucket_start(period, ts))
+                acc[key] = acc.get(key, 0) + minutes
+
+    if acc:
+        db.session.execute(insert(PlaytimeRollup), [
+            {
+                'user_game_id': user_game_id, 'user_id': user_id,
+                'period': period, 'bucket': bucket,
+                'minutes_delta': minutes, 'last_event_id': upper,
+            }
+            for (period, bucket), minutes in acc.items()
+        ])
+
+
+def rebuild_rollups(user_game_ids, batch_size=1000):
+    # Повний перерахунок агрегатів для записів, куди перенесли чужі події (злиття ігор).
+    # Межа — поточний водяний знак: новіші події лишаються "pending", як і для решти.
+    watermark = _watermark()
+    rows = db.session.execute(
+        select(UserGame.id, UserGame.user_id).where(UserGame.id.in_(user_game_ids))
+    ).all()
+    for user_game_id, user_id in rows:
+        _rollup_user_game(user_game_id, user_id, 0, watermark, batch_size)
+
+
+# -------------------- Графіки --------------------
+
+def playtime_series(user_id, user_game_id=None, max_points=CHART_MAX_POINTS, now=None):
+    # Точки кумулятивного часу (години) для гри або всієї бібліотеки користувача.
+    # Кількість точок обмежена max_points незалежно від довжини історії.
+    if user_game_id is not None:
+        rollup_scope = PlaytimeRollup.user_game_id == user_game_id
+        event_scope = PlaytimeEvent.user_game_id == user_game_id
+    else:
+        rollup_scope = PlaytimeRollup.user_id == user_id
+        event_scope = PlaytimeEvent.user_game_id.in_(
+            select(UserGame.id).where(UserGame.user_id == user_id)
+        )
+
+    # Ще не агреговані події (після останнього запуску rollup) — їх небагато
+    pending = db.session.execute(
+        select(PlaytimeEvent.ts, PlaytimeEvent.minutes_delta)
+        .where(event_scope, PlaytimeEvent.id > _watermark())
+    ).all()
+
+    first = db.session.scalar(
+        select(func.min(PlaytimeRollup.bucket)).where(rollup_scope, PlaytimeRollup.period == 'day')
+    )
+    starts = [ts for ts, _ in pending] + ([first] if first is not None else [])
+    if not starts:
+        return {'period': 'day', 'points': []}
+
+    now = now or int(datetime.now(timezone.utc).timestamp())
+    span_days = (now - min(starts)) // DAY + 1
+    if span_days <= max_points:
+        period = 'day'
+    elif span_days // 7 + 1 <= max_points:
+        period = 'week'
+    else:
+        period = 'month'
+
+    buckets = dict(db.session.execute(
+        select(PlaytimeRollup.bucket, func.sum(PlaytimeRollup.minutes_delta))
+        .where(rollup_scope, PlaytimeRollup.period == period)
+        .group_by(PlaytimeRollup.bucket)
+    ).all())
+    for ts, minutes in pending:
+        key = bucket_start(period, ts)
+        buckets[key] = buckets.get(key, 0) + minutes
+
+    points = []
+    total = 0
+    for bucket in sorted(buckets):
+        total += buckets[bucket]
+        points.append({'t': bucket, 'hours': round(total / 60, 2)})
+
+    # Дуже довга історія (місяців більше за max_points) — проріджуємо,
+    # лишаючи останнє значення кожної групи (ряд кумулятивний)
+    if len(points) > max_points:
+        step = -(-len(points) // max_points)
+        points = points[step - 1::step] + ([points[-1]] if len(points) % step else [])
+
+    return {'period': period, 'points': points}
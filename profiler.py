@@ -0,0 +1,209 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+from flask import g, request
+
+PROFILE_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile'
+MODES = {'cprofile', 'sample', 'alloc'}
+
+# Групуємо функції за бібліотекою, щоб бачити, де саме йде час
+PACKAGES = (
+    ('flask', ('/flask/', '/werkzeug/', '/flask_login/', '/flask_babel/', '/flask_wtf/')),
+    ('sqlalchemy', ('/sqlalchemy/', '/flask_sqlalchemy/')),
+    ('jinja', ('/jinja2/', '/markupsafe/')),
+    ('requests', ('/requests/', '/urllib3/')),
+)
+TOP_N = 15
+SAMPLE_INTERVAL = 0.005
+
+
+def _package(filename):
+    for name, markers in PACKAGES:
+        if any(marker in filename for marker in markers):
+            return name
+    return 'app' if filename.startswith(os.path.dirname(os.path.abspath(__file__))) else 'other'
+
+
+def _label(filename):
+    # "flask/app.py" замість просто "app.py" — інакше не відрізнити від нашого app.py
+    return '/'.join(filename.replace(os.sep, '/').rsplit('/', 2)[-2:])
+
+
+def _requested_modes():
+    # Дешева перевірка: без прапорця — жодної роботи
+    value = request.args.get(PROFILE_PARAM) or request.headers.get(PROFILE_HEADER)
+    if not value:
+        return None
+    modes = {m.strip() for m in value.lower().split(',')} & MODES
+    return modes or {'cprofile'}
+
+
+class _Sampler(threading.Thread):
+    # Семплюючий профайлер: раз на інтервал знімає стек потоку запиту
+    # і рахує "згорнуті" стеки (формат flamegraph.pl / speedscope)
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{_label(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def _top_functions(profile):
+    stats = pstats.Stats(profile)
+    rows = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in stats.stats.items():
+        rows.append({
+            'package': _package(filename),
+            'function': f"{_label(filename)}:{line}({name})",
+            'calls': calls,
+            'tottime_ms': round(tottime * 1000, 3),
+            'cumtime_ms': round(cumtime * 1000, 3),
+        })
+    rows.sort(key=lambda r: r['cumtime_ms'], reverse=True)
+
+    by_package = {}
+    for row in rows:
+        bucket = by_package.setdefault(row['package'], {'tottime_ms': 0.0, 'top': []})
+        bucket['tottime_ms'] = round(bucket['tottime_ms'] + row['tottime_ms'], 3)
+        if len(bucket['top']) < TOP_N:
+            bucket['top'].append(row)
+    return rows[:TOP_N], by_package
+
+
+def init_profiler(app, is_admin):
+    # Профілювання окремих запитів адміністратора за ?_profile=... або X-Profile: ...
+    # Вимкнено в конфігу — хуки взагалі не реєструються (нульові накладні витрати).
+    if not app.config.get('PROFILING_ENABLED'):
+        return
+    out_dir = app.config['PROFILE_DIR']
+    os.makedirs(out_dir, exist_ok=True)
+    alloc_lock = threading.Lock()
+
+    @app.before_request
+    def _start_profiling():
+        modes = _requested_modes()
+        if not modes or not is_admin():
+            return
+        if random.random() >= app.config['PROFILE_SAMPLE_RATE']:
+            return
+
+        state = {'modes': modes, 'started': time.perf_counter()}
+        if 'alloc' in modes and alloc_lock.acquire(blocking=False):
+            tracemalloc.start(25)
+            state['alloc'] = True
+        if 'sample' in modes:
+            state['sampler'] = _Sampler(threading.get_ident())
+            state['sampler'].start()
+        if 'cprofile' in modes:
+            state['profile'] = cProfile.Profile()
+            state['profile'].enable()
+        g._profiling = state
+
+    @app.after_request
+    def _finish_profiling(response):
+        state = g.pop('_profiling', None)
+        if state is None:
+            return response
+
+        summary = _stop(state)
+        profile_id = f"{int(time.time() * 1000)}-{request.endpoint or 'unknown'}-{uuid.uuid4().hex[:6]}"
+        summary.update({
+            'id': profile_id,
+            'endpoint': request.endpoint,
+            'path': request.full_path,
+            'status': response.status_code,
+            'files': [],
+        })
+
+        if 'profile' in state:
+            state['profile'].dump_stats(os.path.join(out_dir, f"{profile_id}.pstats"))
+            summary['files'].append(f"{profile_id}.pstats")
+        if 'sampler' in state:
+            with open(os.path.join(out_dir, f"{profile_id}.folded"), 'w', encoding='utf-8') as f:
+                for stack, count in state['sampler'].stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+            summary['files'].append(f"{profile_id}.folded")
+        if 'snapshot' in state:
+            with open(os.path.join(out_dir, f"{profile_id}.alloc.txt"), 'w', encoding='utf-8') as f:
+                for stat in state['snapshot'].statistics('traceback')[:TOP_N]:
+                    f.write(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks\n")
+                    f.write("\n".join(stat.traceback.format(limit=10)) + "\n\n")
+            summary['files'].append(f"{profile_id}.alloc.txt")
+
+        with open(os.path.join(out_dir, f"{profile_id}.json"), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=1)
+
+        response.headers['X-Profile-Id'] = profile_id
+        response.headers['Server-Timing'] = f"app;dur={summary['duration_ms']}"
+        return response
+
+    @app.teardown_request
+    def _abort_profiling(exc):
+        # Виняток до after_request — просто зупиняємо все, що встигли запустити
+        state = g.pop('_profiling', None)
+        if state is not None:
+            _stop(state)
+
+    def _stop(state):
+        if 'profile' in state:
+            state['profile'].disable()
+        if 'sampler' in state:
+            state['sampler'].stop()
+        summary = {'duration_ms': round((time.perf_counter() - state['started']) * 1000, 2)}
+        if state.get('alloc'):
+            state['snapshot'] = tracemalloc.take_snapshot()
+            summary['alloc_peak_kib'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            tracemalloc.stop()
+            alloc_lock.release()
+        if 'profile' in state:
+            summary['top'], summary['packages'] = _top_functions(state['profile'])
+        return summary
+
+
+def list_profiles(out_dir, limit=100):
+    if not os.path.isdir(out_dir):
+        return []
+    names = sorted((n for n in os.listdir(out_dir) if n.endswith('.json')), reverse=True)[:limit]
+    profiles = []
+    for name in names:
+        with open(os.path.join(out_dir, name), encoding='utf-8') as f:
+            profiles.append(json.load(f))
+    return profiles
+
+
+def format_top(summary):
+    # Текстова таблиця топ-функцій (для CLI / швидкого перегляду)
+    out = io.StringIO()
+    for package, bucket in sorted(summary.get('packages', {}).items(), key=lambda kv: -kv[1]['tottime_ms']):
+        out.write(f"[{package}] self time {bucket['tottime_ms']:.1f} ms\n")
+        for row in bucket['top'][:5]:
+            out.write(f"    {row['cumtime_ms']:>9.1f} ms cum  {row['calls']:>6}x  {row['function']}\n")
+    return out.getvalue()
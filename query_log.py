@@ -0,0 +1,131 @@
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+# Лише ці запити має сенс пояснювати через EXPLAIN QUERY PLAN
+EXPLAINABLE = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+# "SCAN t" без індексу, або голий "SEARCH t" (напр. MAX() без індексу) — це прохід усієї таблиці
+SCAN = re.compile(r"^(?:SCAN (?:TABLE )?(\w+)\b(?! USING (?:COVERING )?INDEX)|SEARCH (?:TABLE )?(\w+)$)")
+# "user_game.user_id = ?" / "user_game.game_id IN (...)" у WHERE
+PREDICATE = re.compile(r"\b(\w+)\.(\w+)\s*(=|IN\b|IS\b|<=|>=|<|>|BETWEEN\b)", re.IGNORECASE)
+EQUALITY_OPS = {'=', 'IN', 'IS'}
+
+_write_lock = threading.Lock()
+
+
+def _params_shape(params):
+    # Тільки форма параметрів (типи/кількість), без самих значень
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple, dict)):
+        return {'executemany': len(params), 'row': _params_shape(params[0])}
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [type(value).__name__ for value in params]
+    return None
+
+
+def _explain(conn, statement, parameters):
+    if conn.dialect.name != 'sqlite' or not EXPLAINABLE.match(statement):
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[-1] for row in cursor.fetchall()]
+    except Exception:
+        return None
+    finally:
+        cursor.close()
+
+
+def init_query_log(app, engine):
+    # Логуємо запити, повільніші за SLOW_QUERY_THRESHOLD_MS, у NDJSON-файл
+    threshold = app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    if not threshold:
+        return
+    path = app.config['SLOW_QUERY_LOG']
+
+    # Час старту — на контексті виконання, а не на з'єднанні: якщо запит упав
+    # (IntegrityError, "database is locked"), after_cursor_execute не викликається,
+    # і на з'єднанні з пулу не лишається "завислих" записів
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_start', None)
+        if started is None:
+            return
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms < threshold:
+            return
+        record = {
+            'ts': int(time.time()),
+            'ms': round(elapsed_ms, 2),
+            'route': request.endpoint if has_request_context() else None,
+            'statement': statement,
+            'params': _params_shape(parameters),
+            'plan': None if executemany else _explain(conn, statement, parameters),
+        }
+        line = json.dumps(record, ensure_ascii=False)
+        with _write_lock, open(path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+
+# -------------------- Звіт / порадник індексів --------------------
+
+def _full_scans(plan):
+    return sorted({m.group(1) or m.group(2) for detail in plan or () if (m := SCAN.match(detail))})
+
+
+def suggest_index(statement, table):
+    # Рівності спершу (ліва частина складеного індексу), діапазони — в кінці
+    equality, ranges = [], []
+    for tbl, column, op in PREDICATE.findall(statement):
+        if tbl != table:
+            continue
+        bucket = equality if op.upper() in EQUALITY_OPS else ranges
+        if column not in equality and column not in ranges:
+            bucket.append(column)
+    columns = equality + ranges
+    if not columns:
+        return None
+    return f"CREATE INDEX ix_{table}_{'_'.join(columns)} ON {table} ({', '.join(columns)})"
+
+
+def aggregate(lines):
+    stats = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'routes': set(), 'plan': None})
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        item = stats[record['statement']]
+        item['count'] += 1
+        item['total_ms'] += record['ms']
+        item['max_ms'] = max(item['max_ms'], record['ms'])
+        if record.get('route'):
+            item['routes'].add(record['route'])
+        item['plan'] = record.get('plan') or item['plan']
+
+    report = []
+    for statement, item in stats.items():
+        scans = _full_scans(item['plan'])
+        report.append({
+            'statement': statement,
+            'count': item['count'],
+            'total_ms': round(item['total_ms'], 2),
+            'avg_ms': round(item['total_ms'] / item['count'], 2),
+            'max_ms': round(item['max_ms'], 2),
+            'routes': sorted(item['routes']),
+            'plan': item['plan'],
+            'full_scans': scans,
+            'suggestions': [s for s in (suggest_index(statement, t) for t in scans) if s],
+        })
+    return sorted(report, key=lambda r: r['total_ms'], reverse=True)
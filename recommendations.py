@@ -0,0 +1,143 @@
+from array import array
+from datetime import datetime
+
+import numpy as np
+import scipy.sparse as sp
+from sqlalchemy import delete, func, insert, select
+
+from models import db, Game, UserGame, GameSimilarity, game_genres
+
+TOP_K = 20
+# Частка схожості за спільними власниками; решта — за жанрами
+CO_OWNERSHIP_WEIGHT = 0.8
+# Скільки рядків (ігор) схожості рахуємо за один матричний добуток
+BATCH_SIZE = 512
+
+
+def _id_pairs(stmt, batch_size=10000):
+    # Стрімимо пари id у компактні int64-масиви (без ORM-об'єктів)
+    left, right = array('q'), array('q')
+    for a, b in db.session.execute(stmt.execution_options(yield_per=batch_size)):
+        left.append(a)
+        right.append(b)
+    return np.frombuffer(left, dtype=np.int64), np.frombuffer(right, dtype=np.int64)
+
+
+def _normalize_rows(m):
+    norms = np.sqrt(np.asarray(m.multiply(m).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.diags(1.0 / norms) @ m
+
+
+def build_matrices():
+    # games: відсортовані id ігор, що є хоч у когось у бібліотеці;
+    # owners: гра × користувач, genres: гра × жанр (рядки L2-нормовані)
+    user_ids, game_ids = _id_pairs(select(UserGame.user_id, UserGame.game_id))
+    games = np.unique(game_ids)
+    users, user_idx = np.unique(user_ids, return_inverse=True)
+    game_idx = np.searchsorted(games, game_ids)
+
+    owners = sp.csr_matrix(
+        (np.ones(len(game_idx)), (game_idx, user_idx)),
+        shape=(len(games), len(users)),
+    )
+    owners.data[:] = 1.0  # дублікати посилань не мають давати вагу > 1
+    owners = _normalize_rows(owners).tocsr()
+
+    genre_game_ids, genre_ids = _id_pairs(select(game_genres.c.game_id, game_genres.c.genre_id))
+    known = np.isin(genre_game_ids, games)
+    genre_vocab, genre_idx = np.unique(genre_ids[known], return_inverse=True)
+    genres = sp.csr_matrix(
+        (np.ones(int(known.sum())), (np.searchsorted(games, genre_game_ids[known]), genre_idx)),
+        shape=(len(games), len(genre_vocab)),
+    )
+    genres = _normalize_rows(genres).tocsr()
+
+    return games, owners, genres
+
+
+def _similarity_batch(rows, owners, owners_t, genres):
+    # Косинус за спільними власниками для пачки ігор (batch × games, розріджено),
+    # потім домішуємо жанрову схожість лише для пар-кандидатів
+    co = (owners[rows] @ owners_t).tocoo()
+    keep = co.col != rows[co.row]
+    row, col, co_score = co.row[keep], co.col[keep], co.data[keep]
+
+    if genres.shape[1]:
+        genre_score = np.asarray(genres[rows[row]].multiply(genres[col]).sum(axis=1)).ravel()
+    else:
+        genre_score = np.zeros_like(co_score)
+
+    score = CO_OWNERSHIP_WEIGHT * co_score + (1 - CO_OWNERSHIP_WEIGHT) * genre_score
+    return sp.csr_matrix((score, (row, col)), shape=(len(rows), owners.shape[0]))
+
+
+def _top_k(scores, k):
+    for i in range(scores.shape[0]):
+        start, end = scores.indptr[i], scores.indptr[i + 1]
+        cols, vals = scores.indices[start:end], scores.data[start:end]
+        if len(vals) > k:
+            part = np.argpartition(-vals, k)[:k]
+            cols, vals = cols[part], vals[part]
+        order = np.argsort(-vals)
+        yield i, cols[order], vals[order]
+
+
+def _dirty_game_ids(since):
+    # Ігри користувачів, чия бібліотека змінилась після попереднього перерахунку
+    changed_users = select(UserGame.user_id).where(UserGame.updated_at > since).distinct()
+    return set(db.session.scalars(
+        select(UserGame.game_id).where(UserGame.user_id.in_(changed_users)).distinct()
+    ))
+
+
+def build_similarities(full=False, top_k=TOP_K, batch_size=BATCH_SIZE):
+    last_build = db.session.scalar(select(func.max(GameSimilarity.computed_at)))
+    started = datetime.utcnow()
+
+    games, owners, genres = build_matrices()
+    if full or last_build is None:
+        targets = np.arange(len(games))
+        # Ігри, яких більше ні в кого немає, — прибираємо їхніх сусідів
+        db.session.execute(delete(GameSimilarity).where(
+            GameSimilarity.game_id.not_in(select(UserGame.game_id))
+        ))
+    else:
+        dirty = _dirty_game_ids(last_build)
+        targets = np.flatnonzero(np.isin(games, np.fromiter(dirty, dtype=np.int64, count=len(dirty))))
+
+    owners_t = owners.T.tocsr()
+    for start in range(0, len(targets), batch_size):
+        rows = targets[start:start + batch_size]
+        scores = _similarity_batch(rows, owners, owners_t, genres)
+        batch_ids = games[rows].tolist()
+        db.session.execute(delete(GameSimilarity).where(GameSimilarity.game_id.in_(batch_ids)))
+        values = [
+            {
+                'game_id': batch_ids[i], 'similar_game_id': int(games[col]),
+                'score': float(val), 'computed_at': started,
+            }
+            for i, cols, vals in _top_k(scores, top_k)
+            for col, val in zip(cols, vals)
+            if val > 0
+        ]
+        if values:
+            db.session.execute(insert(GameSimilarity), values)
+        db.session.commit()
+
+    return len(targets)
+
+
+def recommend_for_user(user_id, limit=10):
+    # Один запит: сумуємо схожість сусідів усіх ігор користувача (індекс game_id, score)
+    owned = select(UserGame.game_id).where(UserGame.user_id == user_id)
+    score = func.sum(GameSimilarity.score)
+    stmt = (
+        select(Game)
+        .join(GameSimilarity, GameSimilarity.similar_game_id == Game.id)
+        .where(GameSimilarity.game_id.in_(owned), GameSimilarity.similar_game_id.not_in(owned))
+        .group_by(Game.id)
+        .order_by(score.desc())
+        .limit(limit)
+    )
+    return db.session.scalars(stmt).all()
@@ -0,0 +1,81 @@
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Game  # noqa: E402
+from dedup import find_duplicate_clusters, find_existing_game  # noqa: E402
+
+
+@pytest.fixture
+def catalog():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+
+        def fill(*games):
+            for title, year in games:
+                db.session.add(Game(title=title, platform='PC', release_year=year))
+            db.session.commit()
+            return {g.title: g.id for g in Game.query}
+
+        yield fill
+        db.session.remove()
+
+
+# Регресія: назва без підзаголовка не повинна прив'язуватися до доповнень франшизи
+
+def test_base_title_matching_several_expansions_is_not_linked(catalog):
+    catalog(
+        ('The Witcher 3: Wild Hunt', 2015),
+        ('The Witcher 3: Hearts of Stone', 2015),
+        ('The Witcher 3: Blood and Wine', 2016),
+    )
+    assert find_existing_game('Witcher 3', 'PC', 2015) is None
+    assert find_existing_game('Witcher 3', 'PC', 2016) is None
+    assert find_existing_game('The Witcher 3 - Wild Hunt', 'PC', 2015).title == 'The Witcher 3: Wild Hunt'
+
+
+def test_unique_base_title_match_is_linked(catalog):
+    catalog(('The Witcher 3: Wild Hunt', 2015), ('Hades', 2020))
+    assert find_existing_game('Witcher 3', 'PC', 2015).title == 'The Witcher 3: Wild Hunt'
+
+
+def test_exact_year_is_preferred(catalog):
+    catalog(('Hades', 2019), ('Hades', 2020))
+    assert find_existing_game('Hades', 'PC', 2020).release_year == 2020
+
+
+def test_ambiguous_base_title_is_not_merged(catalog):
+    ids = catalog(
+        ('The Witcher 3: Wild Hunt', 2015),
+        ('Witcher 3', 2015),
+        ('The Witcher 3: Blood and Wine', 2016),
+        ('The Witcher 3: Wild Hunt GOTY', 2015),
+    )
+    clusters = find_duplicate_clusters()
+    assert [sorted(c) for c in clusters] == [
+        sorted([ids['The Witcher 3: Wild Hunt'], ids['The Witcher 3: Wild Hunt GOTY']]),
+    ]
+
+
+def test_franchise_entries_are_not_chained(catalog):
+    catalog(
+        ('Call of Duty', None),
+        ('Call of Duty: Black Ops', 2010),
+        ('Call of Duty: WWII', 2017),
+    )
+    assert find_duplicate_clusters() == []
+
+
+def test_manual_console_add_finds_rawg_platform(catalog):
+    catalog()
+    db.session.add(Game(title='Hades', platform='PlayStation 5', release_year=2021))
+    db.session.commit()
+    assert find_existing_game('Hades', 'PlayStation', 2021).platform == 'PlayStation 5'
+    assert find_existing_game('Hades', 'Xbox', 2021) is None